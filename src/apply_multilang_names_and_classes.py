@@ -4,23 +4,26 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
+import re
 from typing import Any, Dict, List, Tuple
 
+try:
+    from .jsonio import json_dumps, read_json
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, read_json
 
-LANGS = ["en", "es", "de", "fr", "it", "ja", "ko"]
 
+LANGS = ["en", "es", "de", "fr", "it", "ja", "ko"]
 
-def load_json(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+# Una línea "X = Y;" (se parte por el primer "=")
+MAPPING_EQ_LINE_RE = re.compile(r"^([^=\n]*)=(.*)$", re.MULTILINE)
 
 
 def save_json(path: str, obj: Any) -> None:
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    with open(path, "wb") as f:
+        f.write(json_dumps(obj))
 
 
 def parse_mapping_file_eq(text: str) -> Dict[str, str]:
@@ -30,13 +33,9 @@ def parse_mapping_file_eq(text: str) -> Dict[str, str]:
     into { "X": "Y" }
     """
     out: Dict[str, str] = {}
-    for raw in text.splitlines():
-        line = raw.strip()
-        if not line or "=" not in line:
-            continue
-        left, right = line.split("=", 1)
-        left = left.strip().rstrip(";").strip()
-        right = right.strip().rstrip(";").strip()
+    for m in MAPPING_EQ_LINE_RE.finditer(text):
+        left = m.group(1).strip().rstrip(";").strip()
+        right = m.group(2).strip().rstrip(";").strip()
         if left and right:
             out[left] = right
     return out
@@ -108,7 +107,7 @@ def main() -> int:
     ap.add_argument("--write", action="store_true", help="Write in place")
     args = ap.parse_args()
 
-    data = load_json(args.trainers)
+    data = read_json(args.trainers)
     trainers: List[dict] = data.get("trainers", [])
     if not isinstance(trainers, list):
         raise SystemExit("Invalid trainers JSON: 'trainers' is not a list")
@@ -118,7 +117,7 @@ def main() -> int:
     conocidos = parse_mapping_file_eq(conocidos_text)
 
     # names raw rows: build index en_name_only -> list of rows
-    raw = load_json(args.names_raw)
+    raw = read_json(args.names_raw)
     rows = raw.get("rows", [])
     if not isinstance(rows, list):
         raise SystemExit("Invalid names_raw: 'rows' must be a list")
@@ -4,10 +4,19 @@
 from __future__ import annotations
 
 import argparse
-import json
+import io
 import os
+import re
 import logging
-from typing import Any, Dict, List
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from .jsonio import json_dumps, json_loads, read_json
+    from .setfiles import iter_set_files, map_files
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, json_loads, read_json
+    from setfiles import iter_set_files, map_files
 
 # Configuración de logging
 logging.basicConfig(
@@ -17,18 +26,43 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def read_json(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+GLOBAL_ID_RE = re.compile(rb'"global_id"\s*:\s*(\d+)')
+GLOBAL_ID_HEAD_BYTES = io.DEFAULT_BUFFER_SIZE
 
 
 def write_json(path: str, payload: Any) -> None:
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    with open(path, "wb") as f:
+        f.write(json_dumps(payload))
+
 
+def read_global_id(path: Path) -> str:
+    """
+    Lee un fichero de set y devuelve su global_id como string.
+    (Función de módulo para poder usarse desde el pool de procesos.)
 
-def build_global_id_index(sets_dir: str) -> Dict[str, str]:
+    global_id es la primera clave de cada set, así que basta con buscarla con
+    una regex sobre la cabecera en bytes; solo si no aparece se parsea el JSON
+    completo.
+    """
+    try:
+        # Sin buffer: la cabecera se lee con un único read() directo al fichero
+        with open(path, "rb", buffering=0) as f:
+            head = f.read(GLOBAL_ID_HEAD_BYTES)
+            m = GLOBAL_ID_RE.search(head)
+            if m:
+                return m.group(1).decode("ascii")
+            data = json_loads(head + f.readall())
+    except Exception as e:
+        raise RuntimeError(f"Failed reading JSON: {path}. Error: {e}") from e
+
+    if not isinstance(data, dict) or "global_id" not in data:
+        raise KeyError(f"Missing 'global_id' in set file: {path}")
+
+    return str(data["global_id"])
+
+
+def build_global_id_index(sets_dir: str, workers: Optional[int] = None) -> Dict[str, str]:
     """
     Lee todos los JSON de sets y crea:
       global_id (str) -> filename
@@ -36,26 +70,19 @@ def build_global_id_index(sets_dir: str) -> Dict[str, str]:
     Ignora ficheros que:
       - no acaben en .json
       - empiecen por "_" (reservados)
+
+    La lectura se reparte entre varios procesos (o hilos si hay pocos ficheros);
+    el resultado se recoge en el orden del listado, igual que en secuencial.
     """
     if not os.path.isdir(sets_dir):
         raise FileNotFoundError(f"sets_dir not found or not a directory: {sets_dir}")
 
-    out: Dict[str, str] = {}
-    for fn in os.listdir(sets_dir):
-        if not fn.endswith(".json") or fn.startswith("_"):
-            continue
-
-        path = os.path.join(sets_dir, fn)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            raise RuntimeError(f"Failed reading JSON: {path}. Error: {e}") from e
-
-        if "global_id" not in data:
-            raise KeyError(f"Missing 'global_id' in set file: {path}")
+    paths = list(iter_set_files(Path(sets_dir)))
+    names = [p.name for p in paths]
+    gids = map_files(read_global_id, paths, workers, chunksize=64)
 
-        gid = str(data["global_id"])
+    out: Dict[str, str] = {}
+    for fn, gid in zip(names, gids):
         if gid in out and out[gid] != fn:
             logger.warning(f"duplicate global_id {gid}: {out[gid]} and {fn}. Keeping {fn}.")
         out[gid] = fn
@@ -71,6 +98,7 @@ def main() -> int:
     ap.add_argument("--pools", default="data/subway_pools_set45.json")
     ap.add_argument("--sets_dir", default="data/subway_pokemon")
     ap.add_argument("--out", default="data/subway_pools_index_set45.json")
+    ap.add_argument("--workers", type=int, default=None, help="Procesos para leer sets (1 = secuencial)")
     args = ap.parse_args()
 
     pools_data = read_json(args.pools)
@@ -81,6 +109,9 @@ def main() -> int:
 
     trainer_to_pool: Dict[str, str] = {}
     pool_to_trainers: Dict[str, List[dict]] = {}
+    # métodos ligados fuera del bucle (evita el lookup de atributo por trainer)
+    set_trainer_pool = trainer_to_pool.__setitem__
+    set_pool_trainers = pool_to_trainers.__setitem__
 
     for p in pools:
         pid = p.get("pool_id")
@@ -91,14 +122,14 @@ def main() -> int:
         if not isinstance(trainers, list):
             raise ValueError(f"Invalid pool entry {pid}: 'trainers' is not a list")
 
-        pool_to_trainers[pid] = trainers
+        set_pool_trainers(pid, trainers)
         for t in trainers:
             tid = t.get("trainer_id")
             if not tid or not isinstance(tid, str):
                 raise ValueError(f"Invalid trainer entry in pool {pid}: missing/invalid 'trainer_id'")
-            trainer_to_pool[tid] = pid
+            set_trainer_pool(tid, pid)
 
-    global_id_to_setfile = build_global_id_index(args.sets_dir)
+    global_id_to_setfile = build_global_id_index(args.sets_dir, workers=args.workers)
 
     out = {
         "meta": {
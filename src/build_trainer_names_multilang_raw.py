@@ -4,10 +4,14 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
 from typing import Dict, List
 
+try:
+    from .jsonio import json_dumps
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps
+
 
 def read_nonempty_lines(path: str) -> List[str]:
     with open(path, "r", encoding="utf-8") as f:
@@ -17,8 +21,8 @@ def read_nonempty_lines(path: str) -> List[str]:
 
 def write_json(path: str, obj) -> None:
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    with open(path, "wb") as f:
+        f.write(json_dumps(obj))
 
 
 def main() -> int:
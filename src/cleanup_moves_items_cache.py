@@ -13,20 +13,25 @@ Soporta:
 Hace:
 1) En nested: elimina "basura" del root (claves fuera de meta/moves/items).
 2) Elimina entradas not_found:true que tienen un "equivalente bueno":
-   - por compact match (quitar guiones/espacios/puntuación)
    - por alias map explícito (casos irregulares: feint-attack, high-jump-kick, etc.)
+   - por compact match (quitar guiones/espacios/puntuación)
+   (ambas comprobaciones en una sola pasada por tabla)
 3) Opcionalmente escribe el JSON actualizado con --write.
 """
 
 from __future__ import annotations
 
 import argparse
-import json
 import re
 import logging
-from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+
+try:
+    from .jsonio import read_json, write_json
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import read_json, write_json
 
 # Configuración de logging
 logging.basicConfig(
@@ -53,24 +58,23 @@ ITEM_ALIAS_MAP = {
 }
 
 
+# Tabla para str.translate: borra todo ASCII que no sea letra/número
+_COMPACT_DELETE = str.maketrans("", "", "".join(chr(c) for c in range(128) if not chr(c).isalnum()))
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+@lru_cache(maxsize=None)
 def compact_key(s: str) -> str:
     """Normaliza una key para comparación flexible."""
     s = s.strip().lower()
-    # deja solo letras/números para comparar
-    return re.sub(r"[^a-z0-9]+", "", s)
-
-
-def is_not_found(entry: Any) -> bool:
-    return isinstance(entry, dict) and entry.get("not_found") is True
-
+    # deja solo letras/números para comparar (translate en C para el caso ASCII)
+    s = s.translate(_COMPACT_DELETE)
+    if s.isascii():
+        return s
+    return _NON_ALNUM_RE.sub("", s)
 
-def is_good(entry: Any) -> bool:
-    # "good" = existe dict, y not_found no es True
-    return isinstance(entry, dict) and entry.get("not_found") is not True
 
-
-@dataclass(frozen=True)
-class Deletion:
+class Deletion(NamedTuple):
     kind: str  # "move" | "item" | "root"
     key: str
     reason: str
@@ -86,31 +90,53 @@ def root_junk_keys(data: Dict[str, Any]) -> List[str]:
     return [k for k in data.keys() if k not in ROOT_ALLOWED_KEYS]
 
 
-def find_compact_good_match(bad_key: str, table: Dict[str, Any]) -> str | None:
+# Estado de cada entrada en classify_table
+STATUS_OTHER = 0  # no es un dict
+STATUS_GOOD = 1  # dict y not_found no es True
+STATUS_NOT_FOUND = 2  # dict con not_found: true
+
+
+def classify_table(table: Dict[str, Any]) -> Tuple[List[str], List[str], bytearray]:
     """
-    Si bad_key (not_found) tiene otro key en table con mismo compact_key y "good", lo devuelve.
-    Si hay varios, preferimos el primero "good". Si no hay ninguno good, None.
+    Una sola pasada sobre table. Devuelve columnas paralelas:
+      keys, compact_key de cada key, y status (STATUS_*) de cada entrada.
     """
-    target = compact_key(bad_key)
-    candidates = [k for k in table.keys() if compact_key(k) == target and k != bad_key]
-    good = [k for k in candidates if is_good(table.get(k))]
-    return good[0] if good else None
+    keys = list(table.keys())
+    compacts = [compact_key(k) for k in keys]
+    status = bytearray(len(keys))
+    for i, v in enumerate(table.values()):
+        if isinstance(v, dict):
+            status[i] = STATUS_NOT_FOUND if v.get("not_found") is True else STATUS_GOOD
+    return keys, compacts, status
 
 
-def apply_alias_deletions(kind: str, table: Dict[str, Any], alias_map: Dict[str, str]) -> List[Deletion]:
-    deletions: List[Deletion] = []
-    for bad, good in alias_map.items():
-        if bad in table and is_not_found(table.get(bad)) and good in table and is_good(table.get(good)):
-            deletions.append(Deletion(kind=kind, key=bad, reason=f"alias_map keep '{good}'"))
-    return deletions
+def cleanup_table(kind: str, table: Dict[str, Any], alias_map: Dict[str, str]) -> List[Deletion]:
+    """
+    Una sola pasada de borrado sobre table. Para cada entrada not_found:
+      1) si alias_map la lleva a una key "good" -> se borra (alias explícito)
+      2) si no, si otra key "good" tiene el mismo compact_key -> se borra
+         (si hay varias good, se conserva la primera en orden de la tabla)
+    """
+    keys, compacts, status = classify_table(table)
 
+    good_keys: Set[str] = set()
+    first_good_by_compact: Dict[str, str] = {}
+    for k, ck, st in zip(keys, compacts, status):
+        if st == STATUS_GOOD:
+            good_keys.add(k)
+            first_good_by_compact.setdefault(ck, k)
 
-def apply_compact_deletions(kind: str, table: Dict[str, Any]) -> List[Deletion]:
     deletions: List[Deletion] = []
-    for k, v in table.items():
-        if not is_not_found(v):
+    for k, ck, st in zip(keys, compacts, status):
+        if st != STATUS_NOT_FOUND:
             continue
-        keep = find_compact_good_match(k, table)
+
+        alias = alias_map.get(k)
+        if alias is not None and alias in good_keys:
+            deletions.append(Deletion(kind=kind, key=k, reason=f"alias_map keep '{alias}'"))
+            continue
+
+        keep = first_good_by_compact.get(ck)
         if keep:
             deletions.append(Deletion(kind=kind, key=k, reason=f"has_good_compact_match keep '{keep}'"))
     return deletions
@@ -123,9 +149,30 @@ def apply_root_cleanup(data: Dict[str, Any]) -> List[Deletion]:
     return deletions
 
 
-def delete_keys(table: Dict[str, Any], keys: List[str]) -> None:
-    for k in keys:
+# Si se borra más de esta fracción de la tabla, sale más barato reconstruirla
+REBUILD_DELETE_RATIO = 0.05
+
+
+def delete_keys(table: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+    """
+    Borra keys de table y devuelve la tabla resultante.
+    Con muchas borradas se devuelve un dict NUEVO (denso, mismo orden);
+    el llamador debe usar siempre el valor devuelto.
+    """
+    del_set = set(keys)
+    if len(del_set) > len(table) * REBUILD_DELETE_RATIO:
+        return {k: v for k, v in table.items() if k not in del_set}
+    for k in del_set:
         table.pop(k, None)
+    return table
+
+
+def keys_by_kind(deletions: List[Deletion]) -> Dict[str, List[str]]:
+    """Reparte las keys a borrar por kind en una sola pasada (orden de aparición)."""
+    buckets: Dict[str, List[str]] = {}
+    for d in deletions:
+        buckets.setdefault(d.kind, []).append(d.key)
+    return buckets
 
 
 def recalc_meta(data: Dict[str, Any]) -> None:
@@ -155,7 +202,7 @@ def main() -> int:
         logger.warning(f"Cache file not found: {path}")
         return 1
 
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = read_json(path)
     if not isinstance(data, dict):
         logger.error("Invalid cache JSON: root is not an object")
         return 1
@@ -178,48 +225,37 @@ def main() -> int:
         # 1) root cleanup (elimina la “segunda capa” plana)
         deletions.extend(apply_root_cleanup(data))
 
-        # 2) alias map explicit
-        deletions.extend(apply_alias_deletions("move", moves, MOVE_ALIAS_MAP))
-        deletions.extend(apply_alias_deletions("item", items, ITEM_ALIAS_MAP))
-
-        # 3) compact-match deletions (guiones/espacios etc.)
-        deletions.extend(apply_compact_deletions("move", moves))
-        deletions.extend(apply_compact_deletions("item", items))
+        # 2) alias map explícito + compact-match (guiones/espacios etc.), una pasada por tabla
+        deletions.extend(cleanup_table("move", moves, MOVE_ALIAS_MAP))
+        deletions.extend(cleanup_table("item", items, ITEM_ALIAS_MAP))
 
         # aplicar
+        buckets = keys_by_kind(deletions)
         if deletions:
-            root_keys = [d.key for d in deletions if d.kind == "root"]
-            for k in root_keys:
+            for k in buckets.get("root", []):
                 data.pop(k, None)
 
-            move_keys = [d.key for d in deletions if d.kind == "move"]
-            item_keys = [d.key for d in deletions if d.kind == "item"]
-            delete_keys(moves, move_keys)
-            delete_keys(items, item_keys)
+            data["moves"] = delete_keys(moves, buckets.get("move", []))
+            data["items"] = delete_keys(items, buckets.get("item", []))
 
         recalc_meta(data)
 
     else:
         # Flat schema: lo tratamos como "tabla única" y aplicamos compact+alias sobre el root.
         logger.warning("Flat schema detected. Cleaning as a single table (best-effort).")
-        deletions.extend(apply_compact_deletions("root", data))
-        # alias maps sobre root también (por si el flat mezcla todo)
-        deletions.extend(apply_alias_deletions("root", data, MOVE_ALIAS_MAP))
-        deletions.extend(apply_alias_deletions("root", data, ITEM_ALIAS_MAP))
+        # alias maps de moves e items sobre root (por si el flat mezcla todo)
+        deletions.extend(cleanup_table("root", data, {**MOVE_ALIAS_MAP, **ITEM_ALIAS_MAP}))
 
-        if deletions:
-            root_keys = [d.key for d in deletions if d.kind == "root"]
-            for k in root_keys:
-                data.pop(k, None)
+        buckets = keys_by_kind(deletions)
+        for k in buckets.get("root", []):
+            data.pop(k, None)
 
     if not deletions:
         logger.info("No bad entries to delete.")
         return 0
 
     # resumen
-    by_kind: Dict[str, int] = {}
-    for d in deletions:
-        by_kind[d.kind] = by_kind.get(d.kind, 0) + 1
+    by_kind = {kind: len(keys) for kind, keys in buckets.items()}
 
     logger.info(f"Found {len(deletions)} deletions: {by_kind}")
     for d in deletions:
@@ -229,7 +265,7 @@ def main() -> int:
         logger.info("[dry-run] Not writing. Re-run with --write to apply.")
         return 0
 
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    write_json(path, data)
     logger.info(f"Updated cache written: {path}")
     return 0
 
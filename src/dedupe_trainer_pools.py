@@ -13,10 +13,15 @@ from __future__ import annotations
 
 import argparse
 import hashlib
-import json
 import os
 import logging
-from typing import Any, Dict, List
+from operator import itemgetter
+from typing import Any, Dict, List, Tuple
+
+try:
+    from .jsonio import json_dumps, read_json
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, read_json
 
 # Configuración de logging
 logging.basicConfig(
@@ -27,16 +32,31 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def read_json(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
+def write_json_streaming(path: str, payload: Dict[str, Any], stream_key: str) -> None:
+    """
+    Escribe payload como JSON, pero payload[stream_key] (una lista, última
+    clave del objeto) se serializa elemento a elemento: nunca hay en memoria
+    más de un pool serializado a la vez. Los bytes son los mismos que
+    json_dumps(payload) + b"\n".
+    """
+    if list(payload)[-1] != stream_key:
+        raise ValueError(f"'{stream_key}' must be the last key of the payload")
 
-def write_json(path: str, payload: Any) -> None:
+    head = {k: v for k, v in payload.items() if k != stream_key}
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-        f.write("\n")
+    with open(path, "wb") as f:
+        # cabecera sin el "\n}" final: el objeto sigue abierto
+        f.write(json_dumps(head)[:-2] if head else b"{")
+        f.write((b",\n  " if head else b"\n  ") + json_dumps(stream_key) + b": [")
+
+        n = 0
+        for item in payload[stream_key]:
+            # los strings JSON no contienen saltos de línea literales: se puede re-indentar por líneas
+            f.write(b",\n    " if n else b"\n    ")
+            f.write(json_dumps(item).replace(b"\n", b"\n    "))
+            n += 1
+
+        f.write(b"\n  ]\n}\n" if n else b"]\n}\n")
 
 
 def pool_key(ids: List[int]) -> List[int]:
@@ -73,7 +93,9 @@ def main() -> int:
         logger.warning("No hay trainers en el input.")
         return 1
 
-    groups: Dict[str, Dict[str, Any]] = {}
+    # Agrupamos por la tupla ordenada de ids (hashable y barata);
+    # el hash SHA-1 del pool_id solo se calcula una vez por pool único.
+    groups: Dict[Tuple[int, ...], Dict[str, Any]] = {}
 
     for t in trainers:
         pool_ids = t.get("pool_global_ids")
@@ -81,46 +103,42 @@ def main() -> int:
             # si hubiese un trainer malformado, lo saltamos
             continue
 
-        sorted_ids = pool_key([int(x) for x in pool_ids])
-        pid = stable_pool_id(sorted_ids)
+        key = tuple(pool_key([int(x) for x in pool_ids]))
+        g = groups.get(key)
 
-        if pid not in groups:
-            groups[pid] = {
-                "pool_id": pid,
+        if g is None:
+            sorted_ids = list(key)
+            # Ya con la forma final del pool (mismo orden de claves que la salida)
+            g = groups[key] = {
+                "pool_id": stable_pool_id(sorted_ids),
                 "pool_global_ids": sorted_ids,
-                "trainers": [],
+                "pool_size": len(sorted_ids),
+                "trainer_count": 0,
                 "sections": set(),
+                "trainers": [],
             }
 
-        groups[pid]["trainers"].append(
-            {
-                "trainer_id": t.get("trainer_id"),
-                "name_en": t.get("name_en"),
-                # opcional, útil para inspección (no rompe consumidores)
-                "name_es": t.get("name_es"),
-                "section": t.get("section"),
-            }
-        )
-        groups[pid]["sections"].add(t.get("section"))
-
-    pools: List[dict] = []
-    for _, g in groups.items():
-        g["trainers"] = sorted(g["trainers"], key=trainer_sort_key)
-        g["sections"] = sorted([s for s in g["sections"] if s])
-
-        pools.append(
-            {
-                "pool_id": g["pool_id"],
-                "pool_global_ids": g["pool_global_ids"],
-                "pool_size": len(g["pool_global_ids"]),
-                "trainer_count": len(g["trainers"]),
-                "sections": g["sections"],
-                "trainers": g["trainers"],
-            }
-        )
+        entry = {
+            "trainer_id": t.get("trainer_id"),
+            "name_en": t.get("name_en"),
+            # opcional, útil para inspección (no rompe consumidores)
+            "name_es": t.get("name_es"),
+            "section": t.get("section"),
+        }
+        # La clave de orden se calcula una sola vez por trainer
+        g["trainers"].append((trainer_sort_key(entry), entry))
+        g["sections"].add(entry["section"])
+
+    pools: List[dict] = list(groups.values())
+    by_sort_key = itemgetter(0)
+    for p in pools:
+        p["trainers"].sort(key=by_sort_key)
+        p["trainers"] = [entry for _, entry in p["trainers"]]
+        p["trainer_count"] = len(p["trainers"])
+        p["sections"] = sorted(s for s in p["sections"] if s)
 
     # Orden útil: primero pools más frecuentes, luego por pool_size, luego pool_id
-    pools = sorted(pools, key=lambda p: (-p["trainer_count"], p["pool_size"], p["pool_id"]))
+    pools.sort(key=lambda p: (-p["trainer_count"], p["pool_size"], p["pool_id"]))
 
     out = {
         "meta": {
@@ -131,7 +149,7 @@ def main() -> int:
         "pools": pools,
     }
 
-    write_json(args.out, out)
+    write_json_streaming(args.out, out, "pools")
     logger.info(f"Guardado: {args.out} (unique_pools={len(pools)})")
 
     # Vista rápida
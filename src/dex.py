@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Mapeo especie -> número de Pokédex a partir de los sprites de base_stats.json,
+compartido por los enriquecedores que añaden dex_number a los sets.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional
+
+DEX_FROM_SPRITE_RE = re.compile(r"/pokemon/(\d+)\.(?:png|gif)$", re.IGNORECASE)
+SPECIES_KEY_STRIP_RE = re.compile(r"[^a-z0-9]+")
+
+
+def extract_dex_from_sprite_url(url: str) -> Optional[int]:
+    m = DEX_FROM_SPRITE_RE.search(url.strip())
+    if not m:
+        return None
+    try:
+        return int(m.group(1))
+    except ValueError:
+        return None
+
+
+def species_key(species: str) -> str:
+    """Forma normalizada de una especie: minúsculas y sin separadores ("Mr. Mime" -> "mrmime")."""
+    return SPECIES_KEY_STRIP_RE.sub("", species.lower())
+
+
+def build_species_to_dex(base_stats: dict) -> Dict[str, int]:
+    """
+    Estructura real:
+      {
+        "meta": {...},
+        "errors": [...],
+        "data": {
+          "Abomasnow": {
+             "sprites": { "front_default": "https://.../pokemon/460.png", ... },
+             ...
+          },
+          ...
+        }
+      }
+    """
+    if not isinstance(base_stats, dict) or "data" not in base_stats or not isinstance(base_stats["data"], dict):
+        raise RuntimeError("base_stats.json no tiene la clave 'data' como dict.")
+
+    mapping: Dict[str, int] = {}
+    data = base_stats["data"]
+
+    for species, entry in data.items():
+        if not isinstance(entry, dict):
+            continue
+        sprites = entry.get("sprites")
+        if not isinstance(sprites, dict):
+            continue
+
+        front_default = sprites.get("front_default")
+        dex: Optional[int] = None
+
+        if isinstance(front_default, str) and front_default.strip():
+            dex = extract_dex_from_sprite_url(front_default)
+
+        if dex is None:
+            for v in sprites.values():
+                if isinstance(v, str) and v.strip():
+                    dex = extract_dex_from_sprite_url(v)
+                    if dex is not None:
+                        break
+
+        if dex is not None:
+            mapping[species] = dex
+
+    if not mapping:
+        raise RuntimeError("No pude construir mapping species->dex_number desde base_stats.json (data.*.sprites.*).")
+
+    # Indexa también la forma normalizada para que variantes de mayúsculas,
+    # espacios o puntuación no fallen; el nombre exacto siempre tiene prioridad
+    for species, dex in list(mapping.items()):
+        mapping.setdefault(species_key(species), dex)
+
+    return mapping
+
+
+def lookup_dex(species_to_dex: Dict[str, int], species: str) -> Optional[int]:
+    dex = species_to_dex.get(species)
+    if dex is None:
+        dex = species_to_dex.get(species_key(species))
+    return dex
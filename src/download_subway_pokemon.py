@@ -11,17 +11,28 @@ Fuente: https://www.smogon.com/ingame/bc/bw_subway_pokemon
 from __future__ import annotations
 
 import argparse
-import json
 import re
 import time
 import logging
-from dataclasses import asdict, dataclass
+import os
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 
+try:
+    from .html_parser import HTML_PARSER
+    from .jsonio import json_dumps, write_json
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from html_parser import HTML_PARSER
+    from jsonio import json_dumps, write_json
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,34 +43,38 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_URL = "https://www.smogon.com/ingame/bc/bw_subway_pokemon"
 
+# Regex compiladas una sola vez (se usan por cada línea/celda parseada)
+_HEADER_RE = re.compile(r"^pokemon\s+nature\s+item\s+move\s+1", re.IGNORECASE)
+_LINE_RE = re.compile(r"^(?P<id>\d+)\s+(?P<rest>.+)$")
+_NONALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# Stats válidos en el token de EVs ("Atk/Spe", "HP/SpD"...)
+_EV_STATS = frozenset({"HP", "Atk", "Def", "SpA", "SpD", "Spe"})
+
 
 # ----------------------------
 # Helpers
 # ----------------------------
+@lru_cache(maxsize=1024)
 def slugify(name: str) -> str:
     """
     Convierte un nombre a slug seguro para fichero:
     - lower
     - elimina acentos (si los hubiera)
     - quita todo lo que no sea alfanumérico
+
+    Se memoiza: cada especie aparece en varios sets (988 sets, ~300 especies).
     """
     name = name.strip().lower()
     try:
-        import unicodedata
-
         name = unicodedata.normalize("NFKD", name)
         name = "".join(ch for ch in name if not unicodedata.combining(ch))
     except Exception:
         pass
-    name = re.sub(r"[^a-z0-9]+", "", name)
+    name = _NONALNUM_RE.sub("", name)
     return name
 
 
-def write_json(path: Path, payload: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-
 # ----------------------------
 # Data model
 # ----------------------------
@@ -74,18 +89,31 @@ class SubwaySet:
     variant_index: int  # 1..N para esa especie (gengar1, gengar2...)
     source_url: str = DEFAULT_URL
 
+    def to_dict(self) -> Dict[str, Any]:
+        # Copia superficial en orden de campos: asdict() hace un deepcopy
+        # recursivo que aquí no hace falta (solo se serializa)
+        return dict(self.__dict__)
+
 
 # ----------------------------
 # Parsing
 # ----------------------------
-def fetch_html(url: str, timeout: int = 30) -> str:
+def fetch_html(url: str, timeout: int = 30) -> Tuple[bytes, Optional[str]]:
+    """
+    Devuelve (cuerpo en bytes, charset del Content-Type o None). El parser
+    decodifica directamente los bytes y nos ahorramos decodificar a str en
+    Python. Si la cabecera no trae charset se devuelve None (no r.encoding,
+    que para text/* sin charset es siempre ISO-8859-1) y el parser lo detecta
+    por el <meta charset> de la página.
+    """
     headers = {
         "User-Agent": "SubwaySetsDownloader/1.1 (personal project; contact: none)",
         "Accept-Language": "en",
     }
     r = requests.get(url, headers=headers, timeout=timeout)
     r.raise_for_status()
-    return r.text
+    has_charset = "charset=" in r.headers.get("Content-Type", "").lower()
+    return r.content, (r.encoding if has_charset else None)
 
 
 def try_parse_from_table(soup: BeautifulSoup, min_rows: int = 200) -> List[Dict[str, str]]:
@@ -114,7 +142,7 @@ def try_parse_from_table(soup: BeautifulSoup, min_rows: int = 200) -> List[Dict[
                 continue
 
             # Intento 1: id al principio
-            if cells and re.fullmatch(r"\d+", cells[0]):
+            if cells and cells[0].isdecimal():
                 if len(cells) >= 9:
                     parsed.append(
                         {
@@ -134,14 +162,14 @@ def try_parse_from_table(soup: BeautifulSoup, min_rows: int = 200) -> List[Dict[
             # Intento 2: buscar un id numérico en las primeras celdas
             first_num_idx = None
             for i, c in enumerate(cells[:3]):
-                if re.fullmatch(r"\d+", c):
+                if c.isdecimal():
                     first_num_idx = i
                     break
             if first_num_idx is None:
                 continue
 
             cells2 = cells[first_num_idx:]
-            if len(cells2) >= 9 and re.fullmatch(r"\d+", cells2[0]):
+            if len(cells2) >= 9 and cells2[0].isdecimal():
                 parsed.append(
                     {
                         "global_id": cells2[0],
@@ -173,18 +201,15 @@ def parse_fallback_from_text(soup: BeautifulSoup) -> List[Dict[str, str]]:
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
 
     start_idx = 0
-    header_re = re.compile(r"^pokemon\s+nature\s+item\s+move\s+1", re.IGNORECASE)
     for i, ln in enumerate(lines):
-        if header_re.search(ln):
+        if _HEADER_RE.search(ln):
             start_idx = i + 1
             break
 
     out: List[Dict[str, str]] = []
-    line_re = re.compile(r"^(?P<id>\d+)\s+(?P<rest>.+)$")
-    ev_re = re.compile(r"^(HP|Atk|Def|SpA|SpD|Spe)(/(HP|Atk|Def|SpA|SpD|Spe))*$")
 
     for ln in lines[start_idx:]:
-        m = line_re.match(ln)
+        m = _LINE_RE.match(ln)
         if not m:
             continue
         gid = m.group("id")
@@ -195,7 +220,7 @@ def parse_fallback_from_text(soup: BeautifulSoup) -> List[Dict[str, str]]:
         species = parts[0]
         nature = parts[1]
 
-        evs = parts[-1] if ev_re.match(parts[-1]) else ""
+        evs = parts[-1] if all(p in _EV_STATS for p in parts[-1].split("/")) else ""
         core = parts[:-1] if evs else parts[:]
 
         if len(core) < 1 + 1 + 1 + 4:
@@ -222,8 +247,8 @@ def parse_fallback_from_text(soup: BeautifulSoup) -> List[Dict[str, str]]:
     return out
 
 
-def parse_sets(html: str) -> Tuple[List[SubwaySet], Dict[str, Any]]:
-    soup = BeautifulSoup(html, "html.parser")
+def parse_sets(html: bytes, encoding: Optional[str] = None) -> Tuple[List[SubwaySet], Dict[str, Any]]:
+    soup = BeautifulSoup(html, HTML_PARSER, from_encoding=encoding)
 
     rows = try_parse_from_table(soup)
     parse_mode = "table"
@@ -234,12 +259,12 @@ def parse_sets(html: str) -> Tuple[List[SubwaySet], Dict[str, Any]]:
     if not rows:
         raise RuntimeError("No he podido parsear ningún set. Puede haber cambiado el formato de la página.")
 
-    per_species_count: Dict[str, int] = {}
+    per_species_count: Dict[str, int] = defaultdict(int)
     sets: List[SubwaySet] = []
 
     for r in rows:
         species = r["species"].strip()
-        per_species_count[species] = per_species_count.get(species, 0) + 1
+        per_species_count[species] += 1
         variant_index = per_species_count[species]
 
         moves = [r["move1"], r["move2"], r["move3"], r["move4"]]
@@ -284,7 +309,7 @@ def main() -> int:
 
     logger.info(f"Descargando: {args.url}")
     try:
-        html = fetch_html(args.url, timeout=args.timeout)
+        html, encoding = fetch_html(args.url, timeout=args.timeout)
     except Exception as e:
         logger.error(f"Error fatal al descargar: {e}")
         return 1
@@ -294,35 +319,47 @@ def main() -> int:
 
     logger.info("Parseando sets...")
     try:
-        sets, meta = parse_sets(html)
+        sets, meta = parse_sets(html, encoding)
         logger.info(f"OK: {meta}")
     except Exception as e:
         logger.error(f"Error fatal al parsear: {e}")
         return 1
 
+    by_species: Dict[str, List[str]] = {}
+    by_global_id: Dict[str, str] = {}
     index: Dict[str, Any] = {
         "meta": meta,
-        "by_species": {},
-        "by_global_id": {},
+        "by_species": by_species,
+        "by_global_id": by_global_id,
     }
 
+    # Un solo listado del directorio en vez de un exists() por set
+    existing: Set[str] = set()
+    if not args.overwrite:
+        with os.scandir(out_dir) as it:
+            existing = {e.name for e in it}
+    # filename -> bytes; si dos sets caen en el mismo nombre se respeta lo de
+    # antes: sin --overwrite gana el primero, con --overwrite el último
+    pending: Dict[str, bytes] = {}
+
     for s in sets:
         base = slugify(s.species)
         filename = f"{base}{s.variant_index}.json"
-        path = out_dir / filename
 
-        if path.exists() and not args.overwrite:
-            # no tocamos index si no escribimos el set
-            index["by_global_id"][str(s.global_id)] = filename
-            index["by_species"].setdefault(s.species, []).append(filename)
+        by_global_id[str(s.global_id)] = filename
+        by_species.setdefault(s.species, []).append(filename)
+
+        if filename in existing or (not args.overwrite and filename in pending):
             continue
 
-        payload = asdict(s)
+        payload = s.to_dict()
         payload["filename"] = filename
-        write_json(path, payload)
+        pending[filename] = json_dumps(payload) + b"\n"
 
-        index["by_global_id"][str(s.global_id)] = filename
-        index["by_species"].setdefault(s.species, []).append(filename)
+    # Cientos de ficheros pequeños: la escritura es I/O puro, así que se
+    # reparte entre hilos (el GIL se libera durante write)
+    with ThreadPoolExecutor() as ex:
+        list(ex.map(lambda item: (out_dir / item[0]).write_bytes(item[1]), pending.items()))
 
     write_json(out_dir / "_index.json", index)
 
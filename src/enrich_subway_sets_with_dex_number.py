@@ -4,11 +4,18 @@
 from __future__ import annotations
 
 import argparse
-import json
-import re
 import logging
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict
+
+try:
+    from .dex import build_species_to_dex, lookup_dex
+    from .jsonio import read_json, write_json
+    from .setfiles import iter_set_files, map_files
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from dex import build_species_to_dex, lookup_dex
+    from jsonio import read_json, write_json
+    from setfiles import iter_set_files, map_files
 
 # Configuración de logging
 logging.basicConfig(
@@ -18,82 +25,38 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-DEX_FROM_SPRITE_RE = re.compile(r"/pokemon/(\d+)\.(?:png|gif)$", re.IGNORECASE)
-
-
-def read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def write_json(path: Path, payload: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
+RESULT_UNCHANGED = 0
+RESULT_UPDATED = 1
+RESULT_MISSING = 2
 
-def extract_dex_from_sprite_url(url: str) -> Optional[int]:
-    m = DEX_FROM_SPRITE_RE.search(url.strip())
-    if not m:
-        return None
-    try:
-        return int(m.group(1))
-    except ValueError:
-        return None
+# Estado de cada worker (se fija una vez por proceso con el initializer)
+_WORKER_STATE: Dict[str, Any] = {}
 
 
-def build_species_to_dex(base_stats: dict) -> Dict[str, int]:
-    """
-    Estructura real:
-      {
-        "meta": {...},
-        "errors": [...],
-        "data": {
-          "Abomasnow": {
-             "sprites": { "front_default": "https://.../pokemon/460.png", ... },
-             ...
-          },
-          ...
-        }
-      }
-    """
-    if not isinstance(base_stats, dict) or "data" not in base_stats or not isinstance(base_stats["data"], dict):
-        raise RuntimeError("base_stats.json no tiene la clave 'data' como dict.")
+def _init_worker(species_to_dex: Dict[str, int], write_in_place: bool, compact: bool) -> None:
+    _WORKER_STATE["species_to_dex"] = species_to_dex
+    _WORKER_STATE["write_in_place"] = write_in_place
+    _WORKER_STATE["compact"] = compact
 
-    mapping: Dict[str, int] = {}
-    data = base_stats["data"]
 
-    for species, entry in data.items():
-        if not isinstance(entry, dict):
-            continue
-        sprites = entry.get("sprites")
-        if not isinstance(sprites, dict):
-            continue
+def process_set_file(path: Path) -> int:
+    data = read_json(path)
 
-        front_default = sprites.get("front_default")
-        dex: Optional[int] = None
+    species = data.get("species")
+    if not isinstance(species, str):
+        return RESULT_MISSING
 
-        if isinstance(front_default, str) and front_default.strip():
-            dex = extract_dex_from_sprite_url(front_default)
+    dex = lookup_dex(_WORKER_STATE["species_to_dex"], species)
+    if not isinstance(dex, int):
+        return RESULT_MISSING
 
-        if dex is None:
-            for v in sprites.values():
-                if isinstance(v, str) and v.strip():
-                    dex = extract_dex_from_sprite_url(v)
-                    if dex is not None:
-                        break
+    if data.get("dex_number") == dex:
+        return RESULT_UNCHANGED
 
-        if dex is not None:
-            mapping[species] = dex
-
-    if not mapping:
-        raise RuntimeError("No pude construir mapping species->dex_number desde base_stats.json (data.*.sprites.*).")
-
-    return mapping
-
-
-def iter_set_files(sets_dir: Path):
-    for p in sets_dir.iterdir():
-        if p.is_file() and p.suffix == ".json" and not p.name.startswith("_"):
-            yield p
+    data["dex_number"] = dex
+    if _WORKER_STATE["write_in_place"]:
+        write_json(path, data, compact=_WORKER_STATE["compact"])
+    return RESULT_UPDATED
 
 
 def main() -> int:
@@ -101,6 +64,8 @@ def main() -> int:
     ap.add_argument("--sets_dir", default="data/subway_pokemon")
     ap.add_argument("--base_stats", default="data/base_stats.json")
     ap.add_argument("--write_in_place", action="store_true")
+    ap.add_argument("--compact", action="store_true", help="JSON compacto (sin indentar) al escribir")
+    ap.add_argument("--workers", type=int, default=None, help="Procesos para los sets (1 = secuencial)")
     args = ap.parse_args()
 
     sets_dir = Path(args.sets_dir)
@@ -109,29 +74,14 @@ def main() -> int:
     base_stats = read_json(base_stats_path)
     species_to_dex = build_species_to_dex(base_stats)
 
-    updated = 0
-    missing = 0
-    total = 0
-
-    for path in iter_set_files(sets_dir):
-        data = read_json(path)
-        total += 1
-
-        species = data.get("species")
-        if not isinstance(species, str):
-            missing += 1
-            continue
-
-        dex = species_to_dex.get(species)
-        if not isinstance(dex, int):
-            missing += 1
-            continue
-
-        if data.get("dex_number") != dex:
-            data["dex_number"] = dex
-            updated += 1
-            if args.write_in_place:
-                write_json(path, data)
+    paths = list(iter_set_files(sets_dir))
+    init_args = (species_to_dex, args.write_in_place, args.compact)
+
+    results = map_files(process_set_file, paths, args.workers, _init_worker, init_args)
+
+    total = len(paths)
+    updated = results.count(RESULT_UPDATED)
+    missing = results.count(RESULT_MISSING)
 
     logger.info(f"Done dex_number. total_sets={total} updated={updated} missing_species={missing}")
     if not args.write_in_place:
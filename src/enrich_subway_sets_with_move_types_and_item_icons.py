@@ -4,11 +4,21 @@
 from __future__ import annotations
 
 import argparse
-import json
-import re
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from .dex import build_species_to_dex, lookup_dex
+    from .jsonio import read_json, write_json
+    from .setfiles import iter_set_files, map_files
+    from .slugs import canonical_slug
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from dex import build_species_to_dex, lookup_dex
+    from jsonio import read_json, write_json
+    from setfiles import iter_set_files, map_files
+    from slugs import canonical_slug
 
 # Configuración de logging
 logging.basicConfig(
@@ -22,32 +32,8 @@ logger = logging.getLogger(__name__)
 # Slug helpers (moves/items)
 # ----------------------------
 
-_CAMEL_SPLIT = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
-_NON_ALNUM = re.compile(r"[^a-zA-Z0-9]+")
-
-
-def canonical_slug(name: str) -> str:
-    """
-    Convert Smogon-ish names into a PokeAPI-friendly kebab-case slug.
-      - "BrightPowder" -> "bright-powder"
-      - "Black Belt"   -> "black-belt"
-      - "BubbleBeam"   -> "bubble-beam"
-      - "Will-O-Wisp"  -> "will-o-wisp"
-      - "Hi Jump Kick" -> "hi-jump-kick" (then alias-mapped to "high-jump-kick")
-    """
-    if not name:
-        return ""
-    s = name.strip().replace("_", " ").strip()
-
-    # Split CamelCase if no spaces and no hyphens
-    if " " not in s and "-" not in s:
-        s = _CAMEL_SPLIT.sub("-", s)
-
-    s = _NON_ALNUM.sub("-", s)
-    s = re.sub(r"-{2,}", "-", s).strip("-").lower()
-    return s
-
 
+@lru_cache(maxsize=4096)
 def compact_slug(slug: str) -> str:
     return (slug or "").replace("-", "")
 
@@ -71,25 +57,6 @@ ITEM_SLUG_ALIASES: Dict[str, str] = {
 }
 
 
-# ----------------------------
-# IO helpers
-# ----------------------------
-
-def iter_set_files(sets_dir: Path) -> Iterable[Path]:
-    for p in sets_dir.iterdir():
-        if p.is_file() and p.suffix == ".json" and not p.name.startswith("_"):
-            yield p
-
-
-def load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def save_json(path: Path, obj: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-
 # ----------------------------
 # Cache access
 # ----------------------------
@@ -99,7 +66,7 @@ def load_cache(cache_path: Path) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     Supports the current schema:
       { "meta": {...}, "moves": {...}, "items": {...} }
     """
-    c = load_json(cache_path)
+    c = read_json(cache_path)
     if not isinstance(c, dict):
         return {}, {}
 
@@ -114,7 +81,18 @@ def load_cache(cache_path: Path) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     return moves, items
 
 
-def resolve_move_slug(raw_move_name: str, moves_cache: Dict[str, Any]) -> str:
+def build_compact_index(cache: Dict[str, Any]) -> Dict[str, str]:
+    """
+    compact_slug(key) -> key for every cache key, built once per run.
+    On collisions the first key in cache order wins, like the old linear scan.
+    """
+    index: Dict[str, str] = {}
+    for k in cache:
+        index.setdefault(compact_slug(k), k)
+    return index
+
+
+def resolve_move_slug(raw_move_name: str, moves_cache: Dict[str, Any], compact_index: Dict[str, str]) -> str:
     """
     1) canonical_slug
     2) alias mapping
@@ -128,16 +106,10 @@ def resolve_move_slug(raw_move_name: str, moves_cache: Dict[str, Any]) -> str:
     if base in moves_cache:
         return base
 
-    target = compact_slug(base)
-    if target:
-        for k in moves_cache.keys():
-            if compact_slug(k) == target:
-                return k
+    return compact_index.get(compact_slug(base), base)
 
-    return base
 
-
-def resolve_item_slug(raw_item_name: str, items_cache: Dict[str, Any]) -> str:
+def resolve_item_slug(raw_item_name: str, items_cache: Dict[str, Any], compact_index: Dict[str, str]) -> str:
     base = canonical_slug(raw_item_name)
     if not base:
         return ""
@@ -146,13 +118,7 @@ def resolve_item_slug(raw_item_name: str, items_cache: Dict[str, Any]) -> str:
     if base in items_cache:
         return base
 
-    target = compact_slug(base)
-    if target:
-        for k in items_cache.keys():
-            if compact_slug(k) == target:
-                return k
-
-    return base
+    return compact_index.get(compact_slug(base), base)
 
 
 def move_type_from_cache(slug: str, moves_cache: Dict[str, Any]) -> Optional[str]:
@@ -171,11 +137,53 @@ def item_sprite_from_cache(slug: str, items_cache: Dict[str, Any]) -> Optional[s
     return u if isinstance(u, str) and u else None
 
 
+class CacheLookups(NamedTuple):
+    """Everything enrich_set needs to resolve names, built once per worker."""
+
+    # cache key -> type / sprite (None if missing or invalid), flattened once
+    # so the hot path is a plain dict.get with no isinstance checks
+    move_types: Dict[str, Optional[str]]
+    item_sprites: Dict[str, Optional[str]]
+    moves_index: Dict[str, str]  # compact_slug -> cache key
+    items_index: Dict[str, str]
+    # raw name -> (slug, type / sprite): the same few hundred names repeat
+    # across every set file, so each is resolved only once per run
+    move_memo: Dict[str, Tuple[str, Optional[str]]]
+    item_memo: Dict[str, Tuple[str, Optional[str]]]
+
+
+def build_lookups(moves_cache: Dict[str, Any], items_cache: Dict[str, Any]) -> CacheLookups:
+    return CacheLookups(
+        move_types={k: move_type_from_cache(k, moves_cache) for k in moves_cache},
+        item_sprites={k: item_sprite_from_cache(k, items_cache) for k in items_cache},
+        moves_index=build_compact_index(moves_cache),
+        items_index=build_compact_index(items_cache),
+        move_memo={},
+        item_memo={},
+    )
+
+
+def resolve_move(raw_name: str, lk: CacheLookups) -> Tuple[str, Optional[str]]:
+    hit = lk.move_memo.get(raw_name)
+    if hit is None:
+        slug = resolve_move_slug(raw_name, lk.move_types, lk.moves_index)
+        hit = lk.move_memo[raw_name] = (slug, lk.move_types.get(slug))
+    return hit
+
+
+def resolve_item(raw_name: str, lk: CacheLookups) -> Tuple[str, Optional[str]]:
+    hit = lk.item_memo.get(raw_name)
+    if hit is None:
+        slug = resolve_item_slug(raw_name, lk.item_sprites, lk.items_index)
+        hit = lk.item_memo[raw_name] = (slug, lk.item_sprites.get(slug))
+    return hit
+
+
 # ----------------------------
 # Main enrichment
 # ----------------------------
 
-def enrich_set(d: Dict[str, Any], moves_cache: Dict[str, Any], items_cache: Dict[str, Any]) -> bool:
+def enrich_set(d: Dict[str, Any], lookups: CacheLookups) -> bool:
     changed = False
 
     # --- Moves -> moves_meta ---
@@ -186,8 +194,7 @@ def enrich_set(d: Dict[str, Any], moves_cache: Dict[str, Any], items_cache: Dict
             if not isinstance(m, str) or not m.strip():
                 continue
             raw_name = m.strip()
-            slug = resolve_move_slug(raw_name, moves_cache)
-            t = move_type_from_cache(slug, moves_cache)
+            slug, t = resolve_move(raw_name, lookups)
             new_moves_meta.append({"name": raw_name, "slug": slug, "type": t})
 
         if d.get("moves_meta") != new_moves_meta:
@@ -198,8 +205,7 @@ def enrich_set(d: Dict[str, Any], moves_cache: Dict[str, Any], items_cache: Dict
     item = d.get("item")
     if isinstance(item, str) and item.strip():
         raw_item = item.strip()
-        item_slug = resolve_item_slug(raw_item, items_cache)
-        sprite = item_sprite_from_cache(item_slug, items_cache)
+        item_slug, sprite = resolve_item(raw_item, lookups)
 
         if d.get("item_slug") != item_slug:
             d["item_slug"] = item_slug
@@ -211,32 +217,77 @@ def enrich_set(d: Dict[str, Any], moves_cache: Dict[str, Any], items_cache: Dict
     return changed
 
 
+def apply_dex_number(d: Dict[str, Any], species_to_dex: Dict[str, int]) -> bool:
+    """Same rule as enrich_subway_sets_with_dex_number, applied in this pass."""
+    species = d.get("species")
+    dex = lookup_dex(species_to_dex, species) if isinstance(species, str) else None
+    if not isinstance(dex, int) or d.get("dex_number") == dex:
+        return False
+    d["dex_number"] = dex
+    return True
+
+
+# Estado de cada worker: los caches se pasan una sola vez por proceso
+# (initializer) en lugar de serializarlos con cada fichero.
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(
+    moves_cache: Dict[str, Any],
+    items_cache: Dict[str, Any],
+    species_to_dex: Optional[Dict[str, int]],
+    write_in_place: bool,
+    compact: bool,
+) -> None:
+    _WORKER_STATE["lookups"] = build_lookups(moves_cache, items_cache)
+    _WORKER_STATE["species_to_dex"] = species_to_dex
+    _WORKER_STATE["write_in_place"] = write_in_place
+    _WORKER_STATE["compact"] = compact
+
+
+def process_set_file(path: Path) -> bool:
+    """Enriches one set file; returns True if it changed."""
+    d = read_json(path)
+    if not isinstance(d, dict):
+        return False
+
+    changed = enrich_set(d, _WORKER_STATE["lookups"])
+    species_to_dex = _WORKER_STATE["species_to_dex"]
+    if species_to_dex is not None:
+        changed = apply_dex_number(d, species_to_dex) or changed
+    if changed and _WORKER_STATE["write_in_place"]:
+        write_json(path, d, compact=_WORKER_STATE["compact"])
+    return changed
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--sets_dir", default="data/subway_pokemon", help="Directory with per-set JSON files")
     ap.add_argument("--cache", default="data/moves_items_cache.json", help="Path to moves/items cache JSON")
     ap.add_argument("--write_in_place", action="store_true", help="Write changes to the set files")
+    ap.add_argument(
+        "--base_stats",
+        default=None,
+        help="Also set dex_number from this base_stats JSON in the same pass "
+        "(replaces a separate enrich_subway_sets_with_dex_number run)",
+    )
+    ap.add_argument("--compact", action="store_true", help="Write compact JSON (no indentation)")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes (1 = sequential)")
     args = ap.parse_args()
 
     sets_dir = Path(args.sets_dir)
     cache_path = Path(args.cache)
 
     moves_cache, items_cache = load_cache(cache_path)
+    species_to_dex = build_species_to_dex(read_json(Path(args.base_stats))) if args.base_stats else None
 
-    total = 0
-    updated = 0
+    paths = list(iter_set_files(sets_dir))
+    init_args = (moves_cache, items_cache, species_to_dex, args.write_in_place, args.compact)
 
-    for path in iter_set_files(sets_dir):
-        total += 1
-        d = load_json(path)
-        if not isinstance(d, dict):
-            continue
+    results = map_files(process_set_file, paths, args.workers, _init_worker, init_args)
 
-        changed = enrich_set(d, moves_cache, items_cache)
-        if changed:
-            updated += 1
-            if args.write_in_place:
-                save_json(path, d)
+    total = len(paths)
+    updated = sum(1 for changed in results if changed)
 
     logger.info(f"enrich. total_sets={total} updated={updated}")
     if not args.write_in_place:
@@ -13,11 +13,18 @@ Añade a cada set:
 from __future__ import annotations
 
 import argparse
-import json
 import math
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from .jsonio import json_dumps, json_loads, read_json
+    from .setfiles import list_set_files, map_files
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, json_loads, read_json
+    from setfiles import list_set_files, map_files
 
 # Configuración de logging
 logging.basicConfig(
@@ -30,89 +37,216 @@ logger = logging.getLogger(__name__)
 STATS = ["HP", "Atk", "Def", "SpA", "SpD", "Spe"]
 
 
-def read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def write_json(path: Path, payload: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-
-def list_set_files(dir_path: Path) -> List[Path]:
-    return sorted(
-        [p for p in dir_path.iterdir() if p.is_file() and p.suffix == ".json" and not p.name.startswith("_")]
-    )
+def write_json(
+    path: Path,
+    payload: Any,
+    previous: Optional[bytes] = None,
+    compact: bool = False,
+    dry_run: bool = False,
+) -> bool:
+    """
+    Escribe el JSON y devuelve True. Si ``previous`` (el contenido actual del
+    fichero) ya coincide byte a byte con lo que se iba a escribir, no toca el
+    disco y devuelve False. Con ``dry_run`` solo compara: devuelve si se habría
+    escrito, sin escribir. El directorio de destino lo crea main() una vez.
+    """
+    raw = json_dumps(payload, compact) + b"\n"
+    if raw == previous:
+        return False
+    if not dry_run:
+        path.write_bytes(raw)
+    return True
 
 
-def parse_evs_text(evs_text: str) -> Dict[str, int]:
+@lru_cache(maxsize=None)
+def parse_evs_vec(evs_text: str) -> Tuple[int, ...]:
     """
     Smogon Subway:
     - 2 stats => 255/255
     - 3 stats => 170/170/170
     Entrada típica: "Atk/Spe" o "HP/Def/SpD"
+
+    Devuelve los EVs en el orden de STATS. Hay pocas decenas de textos
+    distintos en todos los sets, así que se memoiza por texto.
     """
-    parts = [p.strip() for p in (evs_text or "").split("/") if p.strip()]
+    parts = [p.strip() for p in evs_text.split("/") if p.strip()]
     evs = {s: 0 for s in STATS}
 
-    if not parts:
-        return evs
-
-    if len(parts) == 2:
-        per = 255
-    elif len(parts) == 3:
-        per = 170
-    else:
-        per = 510 // len(parts)
-
-    for p in parts:
-        if p in evs:
-            evs[p] = per
-    return evs
-
-
-def nature_modifier(nature: str) -> Dict[str, float]:
+    if parts:
+        if len(parts) == 2:
+            per = 255
+        elif len(parts) == 3:
+            per = 170
+        else:
+            per = 510 // len(parts)
+
+        for p in parts:
+            if p in evs:
+                evs[p] = per
+    return tuple(evs[s] for s in STATS)
+
+
+# Naturaleza -> (stat que sube, stat que baja)
+NATURE_UP_DOWN: Dict[str, Tuple[str, str]] = {
+    "Adamant": ("Atk", "SpA"),
+    "Bold": ("Def", "Atk"),
+    "Brave": ("Atk", "Spe"),
+    "Calm": ("SpD", "Atk"),
+    "Careful": ("SpD", "SpA"),
+    "Gentle": ("SpD", "Def"),
+    "Hasty": ("Spe", "Def"),
+    "Impish": ("Def", "SpA"),
+    "Jolly": ("Spe", "SpA"),
+    "Lax": ("Def", "SpD"),
+    "Lonely": ("Atk", "Def"),
+    "Mild": ("SpA", "Def"),
+    "Modest": ("SpA", "Atk"),
+    "Naive": ("Spe", "SpD"),
+    "Naughty": ("Atk", "SpD"),
+    "Quiet": ("SpA", "Spe"),
+    "Rash": ("SpA", "SpD"),
+    "Relaxed": ("Def", "Spe"),
+    "Sassy": ("SpD", "Spe"),
+    "Timid": ("Spe", "Atk"),
+}
+
+
+def _build_nature_mods() -> Dict[str, Tuple[float, ...]]:
+    table: Dict[str, Tuple[float, ...]] = {}
+    for nature, (up, down) in NATURE_UP_DOWN.items():
+        mods = [1.0] * len(STATS)
+        mods[STATS.index(up)] = 1.1
+        mods[STATS.index(down)] = 0.9
+        table[nature] = tuple(mods)
+    return table
+
+
+# Multiplicadores precalculados una vez por naturaleza, en el orden de STATS
+NATURE_MODS = _build_nature_mods()
+NEUTRAL_MODS = (1.0,) * len(STATS)
+
+
+def nature_modifier(nature: str) -> Tuple[float, ...]:
     """
-    Devuelve multiplicadores por stat.
+    Devuelve los multiplicadores por stat en el orden de STATS.
     """
-    up_down = {
-        "Adamant": ("Atk", "SpA"),
-        "Bold": ("Def", "Atk"),
-        "Brave": ("Atk", "Spe"),
-        "Calm": ("SpD", "Atk"),
-        "Careful": ("SpD", "SpA"),
-        "Gentle": ("SpD", "Def"),
-        "Hasty": ("Spe", "Def"),
-        "Impish": ("Def", "SpA"),
-        "Jolly": ("Spe", "SpA"),
-        "Lax": ("Def", "SpD"),
-        "Lonely": ("Atk", "Def"),
-        "Mild": ("SpA", "Def"),
-        "Modest": ("SpA", "Atk"),
-        "Naive": ("Spe", "SpD"),
-        "Naughty": ("Atk", "SpD"),
-        "Quiet": ("SpA", "Spe"),
-        "Rash": ("SpA", "SpD"),
-        "Relaxed": ("Def", "Spe"),
-        "Sassy": ("SpD", "Spe"),
-        "Timid": ("Spe", "Atk"),
-    }
-
-    mods = {s: 1.0 for s in STATS}
-    if nature in up_down:
-        up, down = up_down[nature]
-        mods[up] = 1.1
-        mods[down] = 0.9
-    return mods
+    return NATURE_MODS.get(nature, NEUTRAL_MODS)
 
 
+# Fórmulas de Gen 5 en aritmética entera (// en vez de floor sobre floats);
+# solo el multiplicador de naturaleza necesita float
 def calc_stat_non_hp(base: int, iv: int, ev: int, level: int, nature: float) -> int:
-    x = math.floor(((2 * base + iv + math.floor(ev / 4)) * level) / 100) + 5
+    x = (2 * base + iv + ev // 4) * level // 100 + 5
+    if nature == 1.0:
+        return x
     return math.floor(x * nature)
 
 
 def calc_hp(base: int, iv: int, ev: int, level: int) -> int:
-    return math.floor(((2 * base + iv + math.floor(ev / 4)) * level) / 100) + level + 10
+    return (2 * base + iv + ev // 4) * level // 100 + level + 10
+
+
+RESULT_SKIPPED = 0
+RESULT_UPDATED = 1
+RESULT_MISSING = 2
+RESULT_UNCHANGED = 3
+RESULT_UP_TO_DATE = 4
+
+# Estado de cada worker (se fija una vez por proceso con el initializer)
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(
+    base_data: Dict[str, Any],
+    level: int,
+    iv: int,
+    write_in_place: bool,
+    compact: bool,
+    out_dir: Path,
+    fresh_after_ns: Optional[int],
+    dry_run: bool,
+) -> None:
+    _WORKER_STATE["base_data"] = base_data
+    _WORKER_STATE["level"] = level
+    _WORKER_STATE["iv"] = iv
+    _WORKER_STATE["write_in_place"] = write_in_place
+    _WORKER_STATE["compact"] = compact
+    _WORKER_STATE["out_dir"] = out_dir
+    _WORKER_STATE["fresh_after_ns"] = fresh_after_ns
+    _WORKER_STATE["dry_run"] = dry_run
+
+
+def is_output_fresh(src: Path, out: Path, fresh_after_ns: int) -> bool:
+    """
+    --incremental: la salida vale si es más nueva que su set y que
+    base_stats.json (fresh_after_ns). Solo mira mtimes, no abre nada.
+    """
+    try:
+        out_ns = out.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return out_ns > max(src.stat().st_mtime_ns, fresh_after_ns)
+
+
+def process_set_file(p: Path) -> int:
+    base_data = _WORKER_STATE["base_data"]
+    level = _WORKER_STATE["level"]
+    iv = _WORKER_STATE["iv"]
+
+    fresh_after_ns = _WORKER_STATE["fresh_after_ns"]
+    if fresh_after_ns is not None and is_output_fresh(p, _WORKER_STATE["out_dir"] / p.name, fresh_after_ns):
+        return RESULT_UP_TO_DATE
+
+    raw = p.read_bytes()
+    s = json_loads(raw)
+    if not isinstance(s, dict):
+        return RESULT_SKIPPED
+
+    sp = s.get("species")
+    if not isinstance(sp, str) or sp not in base_data:
+        return RESULT_MISSING
+
+    base_stats = base_data[sp]["base_stats"]
+    evs_vec = parse_evs_vec(s.get("evs", "") or "")
+    ivs = {k: iv for k in STATS}
+    mods = nature_modifier(s.get("nature", ""))
+
+    # Vectores en el orden de STATS: índice 0 = HP, el resto con naturaleza
+    stats = {"HP": calc_hp(base_stats["HP"], iv, evs_vec[0], level)}
+    for i in range(1, len(STATS)):
+        stat = STATS[i]
+        stats[stat] = calc_stat_non_hp(
+            base=base_stats[stat],
+            iv=iv,
+            ev=evs_vec[i],
+            level=level,
+            nature=mods[i],
+        )
+
+    sprites = base_data[sp].get("sprites") or {}
+    sprite_url = sprites.get("front_default") if isinstance(sprites, dict) else None
+
+    # Mutaciones
+    s["level"] = level
+    s["ivs"] = ivs
+    s["evs_numeric"] = dict(zip(STATS, evs_vec))
+    s["stats_lv50"] = stats
+    s["sprite_url_pokeapi"] = sprite_url
+
+    # Un destino que ya tiene exactamente estos bytes no se reescribe: en sitio
+    # se compara con el propio set y con --out_dir con la salida existente
+    compact = _WORKER_STATE["compact"]
+    dry_run = _WORKER_STATE["dry_run"]
+    if _WORKER_STATE["write_in_place"]:
+        written = write_json(p, s, previous=raw, compact=compact, dry_run=dry_run)
+    else:
+        out_path = _WORKER_STATE["out_dir"] / p.name
+        try:
+            previous: Optional[bytes] = out_path.read_bytes()
+        except FileNotFoundError:
+            previous = None
+        written = write_json(out_path, s, previous=previous, compact=compact, dry_run=dry_run)
+    return RESULT_UPDATED if written else RESULT_UNCHANGED
 
 
 def main() -> int:
@@ -122,7 +256,20 @@ def main() -> int:
     parser.add_argument("--level", type=int, default=50)
     parser.add_argument("--iv", type=int, default=31)
     parser.add_argument("--write_in_place", action="store_true", help="Sobrescribe cada JSON del set")
+    parser.add_argument("--compact", action="store_true", help="JSON compacto (sin indentar) al escribir")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para los sets (1 = secuencial)")
     parser.add_argument("--out_dir", default="data/subway_pokemon_enriched", help="Si no write_in_place, escribe aquí")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Con --out_dir: salta los sets cuya salida es más nueva que el set y que base_stats "
+        "(asume el mismo --level/--iv que la pasada anterior)",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Calcula y compara con lo que hay en disco, pero no escribe nada",
+    )
     args = parser.parse_args()
 
     sets_dir = Path(args.sets_dir)
@@ -144,53 +291,31 @@ def main() -> int:
         logger.warning(f"No encuentro sets en {sets_dir}")
         return 1
 
-    if not args.write_in_place:
+    if not args.write_in_place and not args.dry_run:
         out_dir.mkdir(parents=True, exist_ok=True)
 
-    missing_species = 0
-    updated = 0
-
-    for p in files:
-        s = read_json(p)
-        if not isinstance(s, dict):
-            continue
-
-        sp = s.get("species")
-        if not isinstance(sp, str) or sp not in base_data:
-            missing_species += 1
-            continue
-
-        base_stats = base_data[sp]["base_stats"]
-        evs_num = parse_evs_text(s.get("evs", ""))
-        ivs = {k: args.iv for k in STATS}
-        mods = nature_modifier(s.get("nature", ""))
-
-        stats = {}
-        stats["HP"] = calc_hp(base_stats["HP"], ivs["HP"], evs_num["HP"], args.level)
-        for stat in ["Atk", "Def", "SpA", "SpD", "Spe"]:
-            stats[stat] = calc_stat_non_hp(
-                base=base_stats[stat],
-                iv=ivs[stat],
-                ev=evs_num[stat],
-                level=args.level,
-                nature=mods[stat],
-            )
-
-        sprites = base_data[sp].get("sprites") or {}
-        sprite_url = sprites.get("front_default") if isinstance(sprites, dict) else None
-
-        # Mutaciones
-        s["level"] = args.level
-        s["ivs"] = ivs
-        s["evs_numeric"] = evs_num
-        s["stats_lv50"] = stats
-        s["sprite_url_pokeapi"] = sprite_url
-
-        out_path = p if args.write_in_place else (out_dir / p.name)
-        write_json(out_path, s)
-        updated += 1
-
-    logger.info(f"Process complete. sets={len(files)} updated={updated} missing_species={missing_species}")
+    # En sitio la salida es el propio set, así que su mtime no dice nada
+    fresh_after_ns: Optional[int] = None
+    if args.incremental:
+        if args.write_in_place:
+            logger.warning("--incremental solo aplica con --out_dir; se ignora con --write_in_place.")
+        else:
+            fresh_after_ns = base_stats_path.stat().st_mtime_ns
+
+    init_args = (base_data, args.level, args.iv, args.write_in_place, args.compact, out_dir, fresh_after_ns, args.dry_run)
+
+    results = map_files(process_set_file, files, args.workers, _init_worker, init_args)
+
+    missing_species = results.count(RESULT_MISSING)
+    updated = results.count(RESULT_UPDATED)
+    unchanged = results.count(RESULT_UNCHANGED)
+
+    summary = f"Process complete. sets={len(files)} updated={updated} unchanged={unchanged} missing_species={missing_species}"
+    if fresh_after_ns is not None:
+        summary += f" up_to_date={results.count(RESULT_UP_TO_DATE)}"
+    logger.info(summary)
+    if args.dry_run:
+        logger.info(f"Dry run: no se escribió nada ({updated} ficheros se habrían escrito).")
     if missing_species:
         logger.warning("Faltan especies en base_stats.json: revisa mapeos en normalize_species_for_pokeapi().")
     
@@ -8,14 +8,34 @@ Crea data/base_stats.json consultando PokéAPI SOLO para las especies presentes
 from __future__ import annotations
 
 import argparse
-import json
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import requests
 
+try:
+    from .jsonio import json_dumps, read_json
+    from .pokeapi_http import (
+        DEFAULT_CONCURRENCY,
+        RateLimiter,
+        conditional_headers,
+        make_session,
+        response_validators,
+    )
+    from .setfiles import list_set_files
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, read_json
+    from pokeapi_http import (
+        DEFAULT_CONCURRENCY,
+        RateLimiter,
+        conditional_headers,
+        make_session,
+        response_validators,
+    )
+    from setfiles import list_set_files
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,21 +45,36 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 POKEAPI_POKEMON = "https://pokeapi.co/api/v2/pokemon/{name}"
-
-
-def read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
+USER_AGENT = "MetroBatallaStats/1.0"
+
+# Especies cuyo nombre en PokéAPI no sale de la regla por defecto
+POKEAPI_SPECIAL_NAMES: Dict[str, str] = {
+    "Mr. Mime": "mr-mime",
+    "Mime Jr.": "mime-jr",
+    "Farfetch'd": "farfetchd",
+    "Nidoran♀": "nidoran-f",
+    "Nidoran♂": "nidoran-m",
+    "Deoxys": "deoxys-normal",
+    "Wormadam": "wormadam-plant",
+    "Giratina": "giratina-altered",
+    "Shaymin": "shaymin-land",
+    "Rotom": "rotom",
+    "Basculin": "basculin-red-striped",
+    "Darmanitan": "darmanitan-standard",
+    "Tornadus": "tornadus-incarnate",
+    "Thundurus": "thundurus-incarnate",
+    "Landorus": "landorus-incarnate",
+    "Keldeo": "keldeo-ordinary",
+    "Meloetta": "meloetta-aria",
+}
+
+# Regla por defecto: espacios -> guiones, fuera puntos/apóstrofes, ♀/♂ -> -f/-m
+POKEAPI_NAME_TRANS = str.maketrans({" ": "-", ".": None, "’": None, "'": None, "♀": "-f", "♂": "-m"})
 
 
 def write_json(path: Path, payload: Any) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-
-def list_set_files(dir_path: Path) -> List[Path]:
-    return sorted(
-        [p for p in dir_path.iterdir() if p.is_file() and p.suffix == ".json" and not p.name.startswith("_")]
-    )
+    path.write_bytes(json_dumps(payload) + b"\n")
 
 
 def normalize_species_for_pokeapi(species: str) -> str:
@@ -49,53 +84,93 @@ def normalize_species_for_pokeapi(species: str) -> str:
     """
     s = (species or "").strip()
 
-    special = {
-        "Mr. Mime": "mr-mime",
-        "Mime Jr.": "mime-jr",
-        "Farfetch'd": "farfetchd",
-        "Nidoran♀": "nidoran-f",
-        "Nidoran♂": "nidoran-m",
-        "Deoxys": "deoxys-normal",
-        "Wormadam": "wormadam-plant",
-        "Giratina": "giratina-altered",
-        "Shaymin": "shaymin-land",
-        "Rotom": "rotom",
-        "Basculin": "basculin-red-striped",
-        "Darmanitan": "darmanitan-standard",
-        "Tornadus": "tornadus-incarnate",
-        "Thundurus": "thundurus-incarnate",
-        "Landorus": "landorus-incarnate",
-        "Keldeo": "keldeo-ordinary",
-        "Meloetta": "meloetta-aria",
-    }
-
-    if s in special:
-        return special[s]
+    special = POKEAPI_SPECIAL_NAMES.get(s)
+    if special is not None:
+        return special
 
-    # default: minúsculas y espacios->guiones
-    out = s.lower()
-    out = out.replace(" ", "-")
-    out = out.replace(".", "")
-    out = out.replace("’", "")
-    out = out.replace("'", "")
-    out = out.replace("♀", "-f")
-    out = out.replace("♂", "-m")
-    return out
+    # default: minúsculas + una sola pasada de translate
+    return s.lower().translate(POKEAPI_NAME_TRANS)
 
 
-def fetch_pokemon(name: str, timeout: int = 30) -> dict:
+def fetch_pokemon(
+    name: str,
+    session: requests.Session,
+    timeout: int = 30,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[dict], Dict[str, str]]:
+    """
+    Devuelve (payload, validadores). Con un 304 el payload es None: el recurso
+    no ha cambiado y no hay cuerpo que decodificar.
+    """
     url = POKEAPI_POKEMON.format(name=name)
-    r = requests.get(url, timeout=timeout, headers={"User-Agent": "MetroBatallaStats/1.0"})
+    r = session.get(url, timeout=timeout, headers=headers or None)
+    if r.status_code == 304:
+        return None, {}
     r.raise_for_status()
-    return r.json()
+    return r.json(), response_validators(r)
+
+
+def fetch_species_entry(
+    sp: str,
+    session: requests.Session,
+    timeout: int,
+    limiter: Optional[RateLimiter],
+    previous: Optional[dict] = None,
+) -> Tuple[str, Optional[dict], Optional[str], bool]:
+    """
+    Descarga una especie y devuelve (api_name, entry, error, not_modified).
+    Si hay una entrada previa para el mismo nombre de PokéAPI, la petición es
+    condicional y un 304 devuelve esa misma entrada sin descargar nada.
+    Se ejecuta en los hilos del pool; antes de la petición pide turno al
+    limiter compartido (si lo hay).
+    """
+    api_name = normalize_species_for_pokeapi(sp)
+    if previous is not None and previous.get("pokeapi_name") != api_name:
+        previous = None
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        payload, validators = fetch_pokemon(api_name, session, timeout=timeout, headers=conditional_headers(previous))
+        if payload is None:
+            return api_name, previous, None, True
+        stats = {s["stat"]["name"]: s["base_stat"] for s in payload["stats"]}
+
+        entry = {
+            "pokeapi_name": api_name,
+            "base_stats": {
+                "HP": stats["hp"],
+                "Atk": stats["attack"],
+                "Def": stats["defense"],
+                "SpA": stats["special-attack"],
+                "SpD": stats["special-defense"],
+                "Spe": stats["speed"],
+            },
+            "abilities": [a["ability"]["name"] for a in payload.get("abilities", [])],
+            "sprites": payload.get("sprites", {}),
+        }
+        entry.update(validators)
+        return api_name, entry, None, False
+    except Exception as e:
+        return api_name, None, str(e), False
 
 
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--sets_dir", default="data/subway_pokemon", help="Directorio con JSONs de sets")
     parser.add_argument("--out", default="data/base_stats.json", help="Salida base stats JSON")
-    parser.add_argument("--sleep", type=float, default=0.2, help="Delay entre requests (respeta rate limits)")
+    parser.add_argument("--sleep", type=float, default=0.2, help="Delay mínimo entre requests, compartido por todos los hilos (respeta rate limits)")
     parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Peticiones simultáneas (por defecto: {DEFAULT_CONCURRENCY}; 1 = secuencial)",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignora el --out existente y descarga todo sin peticiones condicionales",
+    )
     args = parser.parse_args()
 
     sets_dir = Path(args.sets_dir)
@@ -122,35 +197,47 @@ def main() -> int:
 
     logger.info(f"Especies únicas detectadas: {len(species)}")
 
-    out: Dict[str, dict] = {}
-    errors: List[str] = []
-
-    for sp in sorted(species):
-        api_name = normalize_species_for_pokeapi(sp)
+    # Entradas de la pasada anterior: sus ETag/Last-Modified permiten pedir
+    # cada especie de forma condicional y reutilizarla si PokéAPI da 304
+    previous: Dict[str, dict] = {}
+    if out_path.exists() and not args.refresh:
         try:
-            payload = fetch_pokemon(api_name, timeout=args.timeout)
-            stats = {s["stat"]["name"]: s["base_stat"] for s in payload["stats"]}
-
-            out[sp] = {
-                "pokeapi_name": api_name,
-                "base_stats": {
-                    "HP": stats["hp"],
-                    "Atk": stats["attack"],
-                    "Def": stats["defense"],
-                    "SpA": stats["special-attack"],
-                    "SpD": stats["special-defense"],
-                    "Spe": stats["speed"],
-                },
-                "abilities": [a["ability"]["name"] for a in payload.get("abilities", [])],
-                "sprites": payload.get("sprites", {}),
-            }
-            logger.info(f"Fetched: {sp} -> OK")
+            prev_data = read_json(out_path).get("data")
+            if isinstance(prev_data, dict):
+                previous = prev_data
         except Exception as e:
-            msg = f"{sp} ({api_name}): {e}"
-            logger.error(f"ERROR: {msg}")
-            errors.append(msg)
+            logger.warning(f"No se pudo leer {out_path}; se descarga todo: {e}")
 
-        time.sleep(args.sleep)
+    out: Dict[str, dict] = {}
+    errors: List[str] = []
+    not_modified_count = 0
+
+    ordered = sorted(species)
+
+    # Las peticiones se solapan en varios hilos; ex.map devuelve los
+    # resultados en orden alfabético, así que out/errors y el log salen
+    # igual que en secuencial
+    # Un único token bucket para todos los hilos: --sleep sigue siendo el hueco
+    # mínimo entre peticiones y la concurrencia solo solapa la latencia
+    limiter = RateLimiter(rate=1.0 / args.sleep, burst=1) if args.sleep > 0 else None
+    session = make_session(args.concurrency, USER_AGENT)
+    with session, ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as ex:
+        results = ex.map(
+            lambda sp: fetch_species_entry(sp, session, args.timeout, limiter, previous.get(sp)),
+            ordered,
+        )
+        for sp, (api_name, entry, err, not_modified) in zip(ordered, results):
+            if entry is not None:
+                out[sp] = entry
+                if not_modified:
+                    not_modified_count += 1
+                    logger.info(f"Fetched: {sp} -> 304 (sin cambios)")
+                else:
+                    logger.info(f"Fetched: {sp} -> OK")
+            else:
+                msg = f"{sp} ({api_name}): {err}"
+                logger.error(f"ERROR: {msg}")
+                errors.append(msg)
 
     result = {
         "meta": {
@@ -163,7 +250,7 @@ def main() -> int:
     }
 
     write_json(out_path, result)
-    logger.info(f"Guardado: {out_path} (Total OK: {len(out)})")
+    logger.info(f"Guardado: {out_path} (Total OK: {len(out)}, sin cambios: {not_modified_count})")
     
     if errors:
         logger.warning("Se produjeron errores durante la descarga. Revisa el mapeo 'special' en el script.")
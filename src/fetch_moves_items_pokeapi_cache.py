@@ -4,16 +4,41 @@
 from __future__ import annotations
 
 import argparse
-import json
+import io
+import os
 import re
 import time
 import logging
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
 
+try:
+    from .jsonio import json_dumps, json_loads, read_json
+    from .pokeapi_http import (
+        DEFAULT_CONCURRENCY,
+        RateLimiter,
+        conditional_headers,
+        make_session,
+        response_validators,
+    )
+    from .setfiles import iter_set_files
+    from .slugs import canonical_slug
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from jsonio import json_dumps, json_loads, read_json
+    from pokeapi_http import (
+        DEFAULT_CONCURRENCY,
+        RateLimiter,
+        conditional_headers,
+        make_session,
+        response_validators,
+    )
+    from setfiles import iter_set_files
+    from slugs import canonical_slug
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,9 +48,19 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 POKEAPI_BASE = "https://pokeapi.co/api/v2"
+USER_AGENT = "battle-subway-helper/1.0"
+
+# Días que un 404 se da por bueno antes de volver a preguntar a PokéAPI
+DEFAULT_NOT_FOUND_TTL_DAYS = 7.0
 
-_CAMEL_SPLIT = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
-_NON_ALNUM = re.compile(r"[^a-zA-Z0-9]+")
+# Cada cuántos resultados se vuelca el cache a disco durante la descarga
+CHECKPOINT_EVERY = 50
+
+# "moves" e "item" se leen de la cabecera de cada set sin parsear el resto
+SET_HEAD_BYTES = io.DEFAULT_BUFFER_SIZE
+MOVES_FIELD_RE = re.compile(rb'"moves"\s*:\s*(\[(?:\s*"(?:[^"\\]|\\.)*"\s*,?)*\s*\])')
+ITEM_FIELD_RE = re.compile(rb'"item"\s*:\s*("(?:[^"\\]|\\.)*"|null)')
+JSON_STRING_RE = re.compile(rb'"(?:[^"\\]|\\.)*"')
 
 MOVE_ALIAS_MAP: Dict[str, str] = {
     "faint-attack": "feint-attack",
@@ -40,19 +75,6 @@ ITEM_ALIAS_MAP: Dict[str, str] = {
 }
 
 
-def canonical_slug(name: str) -> str:
-    if not name:
-        return ""
-    s = name.strip().replace("_", " ").strip()
-
-    if " " not in s and "-" not in s:
-        s = _CAMEL_SPLIT.sub("-", s)
-
-    s = _NON_ALNUM.sub("-", s)
-    s = re.sub(r"-{2,}", "-", s).strip("-").lower()
-    return s
-
-
 def canonical_move_slug(raw: str) -> str:
     base = canonical_slug(raw)
     return MOVE_ALIAS_MAP.get(base, base)
@@ -67,54 +89,141 @@ def canonical_item_slug(raw: str) -> str:
 class FetchResult:
     ok: bool
     payload: Dict[str, Any]
+    # ETag / Last-Modified de la respuesta, para revalidar en la próxima pasada
+    validators: Dict[str, str] = field(default_factory=dict)
+    not_modified: bool = False
 
 
-def http_get_json(url: str, timeout: float = 15.0) -> FetchResult:
+def http_get_json(
+    url: str,
+    session: requests.Session,
+    timeout: float = 15.0,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> FetchResult:
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "battle-subway-helper/1.0"})
+        r = session.get(url, timeout=timeout, headers=extra_headers)
+        if r.status_code == 304:
+            return FetchResult(True, {}, not_modified=True)
         if r.status_code != 200:
             return FetchResult(False, {"status": r.status_code})
-        return FetchResult(True, r.json())
+        return FetchResult(True, r.json(), response_validators(r))
     except Exception as e:
         return FetchResult(False, {"error": str(e)})
 
 
-def fetch_move_type(move_slug: str) -> Tuple[Optional[str], bool, Dict[str, Any]]:
+def fetch_move_type(
+    move_slug: str,
+    session: requests.Session,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Optional[Tuple[Optional[str], bool, Dict[str, Any]]]:
+    """Devuelve (type, not_found, meta), o None si PokéAPI respondió 304."""
     url = f"{POKEAPI_BASE}/move/{move_slug}/"
-    res = http_get_json(url)
+    res = http_get_json(url, session, extra_headers=extra_headers)
+    if res.not_modified:
+        return None
     if not res.ok:
         return None, True, res.payload
     t = res.payload.get("type", {}).get("name")
-    return (t if isinstance(t, str) else None), False, {"status": 200}
+    return (t if isinstance(t, str) else None), False, {"status": 200, **res.validators}
 
 
-def fetch_item_sprite(item_slug: str) -> Tuple[Optional[str], bool, Dict[str, Any]]:
+def fetch_item_sprite(
+    item_slug: str,
+    session: requests.Session,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Optional[Tuple[Optional[str], bool, Dict[str, Any]]]:
+    """Devuelve (sprite_url, not_found, meta), o None si PokéAPI respondió 304."""
     url = f"{POKEAPI_BASE}/item/{item_slug}/"
-    res = http_get_json(url)
+    res = http_get_json(url, session, extra_headers=extra_headers)
+    if res.not_modified:
+        return None
     if not res.ok:
         return None, True, res.payload
     sprite = res.payload.get("sprites", {}).get("default")
-    return (sprite if isinstance(sprite, str) else None), False, {"status": 200}
-
-
-def iter_set_files(sets_dir: Path) -> Iterable[Path]:
-    for p in sets_dir.iterdir():
-        if not p.is_file():
-            continue
-        if p.suffix != ".json":
-            continue
-        if p.name.startswith("_"):
-            continue
-        yield p
-
+    return (sprite if isinstance(sprite, str) else None), False, {"status": 200, **res.validators}
+
+
+def fetch_all(
+    slugs: List[str],
+    fetch_fn: Callable[[str, requests.Session, Optional[Dict[str, str]]], Any],
+    session: requests.Session,
+    limiter: Optional[RateLimiter],
+    concurrency: int,
+    cached: Dict[str, Any],
+) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+    """
+    Lanza fetch_fn(slug, session, headers) en un pool de hilos y va devolviendo
+    (slug, resultado, error) en el mismo orden que slugs. Las peticiones de
+    slugs que ya están en ``cached`` con ETag/Last-Modified son condicionales.
+    Antes de cada petición se pide turno al limiter (si lo hay).
+    """
+    # Las cabeceras se calculan antes de lanzar los hilos: el llamador va
+    # actualizando ``cached`` mientras consume los resultados
+    headers_by_slug = {slug: conditional_headers(cached.get(slug)) for slug in slugs}
+
+    def task(slug: str) -> Tuple[Any, Optional[Exception]]:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fetch_fn(slug, session, headers_by_slug[slug]), None
+        except Exception as e:
+            return None, e
 
-def load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        for slug, (res, err) in zip(slugs, ex.map(task, slugs)):
+            yield slug, res, err
 
 
 def save_json(path: Path, obj: Any) -> None:
+    """
+    Escritura atómica: se vuelca a un temporal en el mismo directorio y se
+    renombra encima. Un corte a mitad nunca deja el cache truncado.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(json_dumps(obj) + b"\n")
+    os.replace(tmp, path)
+
+
+def is_top_level_key(head: bytes, pos: int) -> bool:
+    """
+    True si la clave que empieza en head[pos] pertenece al objeto raíz: fuera
+    de strings, todo lo anterior deja exactamente un "{" sin cerrar.
+    """
+    prefix = JSON_STRING_RE.sub(b"", head[:pos])
+    if b'"' in prefix:  # pos cae dentro de un string
+        return False
+    return prefix.count(b"{") - prefix.count(b"}") == 1 and prefix.count(b"[") == prefix.count(b"]")
+
+
+def read_moves_and_item(path: Path) -> Tuple[Any, Any]:
+    """
+    Devuelve (moves, item) de un fichero de set sin parsear el set entero.
+
+    Ambas claves van al principio de cada set, antes de stats_lv50/moves_meta,
+    así que se localizan con regex sobre la cabecera en bytes y solo se parsean
+    esos dos fragmentos. Si alguno no aparece, no está en el objeto raíz (p. ej.
+    un "moves" anidado antes del de nivel superior) o no es JSON válido, se
+    parsea el fichero completo, como antes.
+    """
+    with open(path, "rb", buffering=0) as f:
+        head = f.read(SET_HEAD_BYTES)
+        m_moves = MOVES_FIELD_RE.search(head)
+        m_item = ITEM_FIELD_RE.search(head)
+        if (
+            m_moves
+            and m_item
+            and is_top_level_key(head, m_moves.start())
+            and is_top_level_key(head, m_item.start())
+        ):
+            try:
+                return json_loads(m_moves.group(1)), json_loads(m_item.group(1))
+            except ValueError:
+                pass
+        d = json_loads(head + f.readall())
+    if not isinstance(d, dict):
+        return None, None
+    return d.get("moves"), d.get("item")
 
 
 def extract_unique_moves_items(sets_dir: Path) -> Tuple[Set[str], Set[str]]:
@@ -122,19 +231,60 @@ def extract_unique_moves_items(sets_dir: Path) -> Tuple[Set[str], Set[str]]:
     items: Set[str] = set()
 
     for path in iter_set_files(sets_dir):
-        d = load_json(path)
+        set_moves, it = read_moves_and_item(path)
 
-        for m in d.get("moves", []) or []:
+        for m in set_moves or []:
             if isinstance(m, str) and m.strip():
                 moves.add(m.strip())
 
-        it = d.get("item")
         if isinstance(it, str) and it.strip():
             items.add(it.strip())
 
     return moves, items
 
 
+def sets_dir_signature(sets_dir: Path) -> List[int]:
+    """
+    [nº de sets, mtime más reciente (ns), tamaño total]: cambia si se añade,
+    borra o reescribe cualquier set. Solo hace stat(), no abre ficheros.
+    """
+    count = newest = total = 0
+    with os.scandir(sets_dir) as it:
+        for e in it:
+            n = e.name
+            if n.endswith(".json") and not n.startswith("_") and e.is_file():
+                st = e.stat()
+                count += 1
+                total += st.st_size
+                newest = max(newest, st.st_mtime_ns)
+    return [count, newest, total]
+
+
+def load_unique_moves_items(sets_dir: Path, scan_cache: Optional[Path]) -> Tuple[Set[str], Set[str]]:
+    """
+    extract_unique_moves_items con un fichero auxiliar opcional: si la firma
+    del directorio no ha cambiado desde la última pasada, se reutilizan los
+    moves/items guardados y no se lee ningún set.
+    """
+    if scan_cache is None:
+        return extract_unique_moves_items(sets_dir)
+
+    key = {"sets_dir": str(sets_dir.resolve()), "signature": sets_dir_signature(sets_dir)}
+    try:
+        saved = read_json(scan_cache)
+        if saved.get("key") == key:
+            logger.info(f"Sets unchanged since last scan; reusing {scan_cache}")
+            return set(saved["moves"]), set(saved["items"])
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable scan cache {scan_cache}: {e}")
+
+    moves, items = extract_unique_moves_items(sets_dir)
+    save_json(scan_cache, {"key": key, "moves": sorted(moves), "items": sorted(items)})
+    return moves, items
+
+
 def ensure_nested_cache(cache_obj: Any) -> Dict[str, Any]:
     if (
         isinstance(cache_obj, dict)
@@ -156,6 +306,32 @@ def ensure_nested_cache(cache_obj: Any) -> Dict[str, Any]:
     return nested
 
 
+def needs_fetch(
+    entry: Any,
+    value_key: str,
+    refetch_not_found: bool,
+    revalidate: bool,
+    not_found_ttl: float,
+    now: float,
+) -> bool:
+    """
+    Decide si hay que (re)descargar una entrada del cache. ``value_key`` es el
+    campo útil de la tabla: "type" en moves, "sprite_url" en items.
+
+    Un 404 se cachea en negativo durante ``not_found_ttl`` segundos desde
+    checked_at_unix (las entradas antiguas sin esa marca se reintentan una
+    vez). Los fallos transitorios (timeout, 5xx) sí se reintentan siempre.
+    """
+    if not isinstance(entry, dict) or revalidate:
+        return True
+    if entry.get("not_found") is True:
+        if refetch_not_found or entry.get("status") != 404:
+            return True
+        checked = entry.get("checked_at_unix")
+        return not isinstance(checked, (int, float)) or now - checked >= not_found_ttl
+    return entry.get(value_key) in (None, "")
+
+
 def update_meta(cache: Dict[str, Any], rate_limit_ms: int) -> None:
     meta = cache.setdefault("meta", {})
     meta["source"] = "pokeapi"
@@ -169,16 +345,40 @@ def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--sets_dir", required=True, help="Directory with per-set JSON files")
     ap.add_argument("--cache", required=True, help="Path to cache JSON")
+    ap.add_argument(
+        "--scan_cache",
+        default=None,
+        help="Optional file to remember the moves/items found in sets_dir; "
+        "reruns skip reading the sets while the directory is unchanged",
+    )
     ap.add_argument(
         "--refetch_not_found",
         action="store_true",
         help="Re-fetch entries previously marked not_found=true",
     )
+    ap.add_argument(
+        "--not_found_ttl_days",
+        type=float,
+        default=DEFAULT_NOT_FOUND_TTL_DAYS,
+        help=f"Days a 404 stays cached before it is retried. Default {DEFAULT_NOT_FOUND_TTL_DAYS:g}.",
+    )
+    ap.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="Re-check every cached entry with a conditional GET (ETag/Last-Modified); "
+        "unchanged ones answer 304 and are kept as is",
+    )
     ap.add_argument(
         "--sleep",
         type=float,
         default=0.12,
-        help="Sleep between requests. Default 0.12.",
+        help="Minimum delay between requests across all workers (rate limit). Default 0.12.",
+    )
+    ap.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Parallel requests. Default {DEFAULT_CONCURRENCY}; 1 = sequential.",
     )
     args = ap.parse_args()
 
@@ -189,70 +389,82 @@ def main() -> int:
         logger.error(f"Directory not found: {sets_dir}")
         return 1
 
-    moves_raw, items_raw = extract_unique_moves_items(sets_dir)
+    scan_cache = Path(args.scan_cache) if args.scan_cache else None
+    moves_raw, items_raw = load_unique_moves_items(sets_dir, scan_cache)
 
-    moves = {canonical_move_slug(m) for m in moves_raw if canonical_move_slug(m)}
-    items = {canonical_item_slug(i) for i in items_raw if canonical_item_slug(i)}
+    # moves_raw/items_raw ya vienen deduplicados: un slug por nombre distinto
+    moves = {slug for slug in map(canonical_move_slug, moves_raw) if slug}
+    items = {slug for slug in map(canonical_item_slug, items_raw) if slug}
 
     cache: Dict[str, Any] = {"meta": {}, "moves": {}, "items": {}}
     if cache_path.exists():
-        cache = ensure_nested_cache(load_json(cache_path))
+        cache = ensure_nested_cache(read_json(cache_path))
 
     moves_cache: Dict[str, Any] = cache.setdefault("moves", {})
     items_cache: Dict[str, Any] = cache.setdefault("items", {})
 
-    def needs_fetch_move(slug: str) -> bool:
-        e = moves_cache.get(slug)
-        if not isinstance(e, dict):
-            return True
-        if args.refetch_not_found and e.get("not_found") is True:
-            return True
-        if e.get("type") in (None, ""):
-            return True
-        return False
-
-    def needs_fetch_item(slug: str) -> bool:
-        e = items_cache.get(slug)
-        if not isinstance(e, dict):
-            return True
-        if args.refetch_not_found and e.get("not_found") is True:
-            return True
-        if e.get("sprite_url") in (None, ""):
-            return True
-        return False
-
-    moves_to_fetch = sorted([m for m in moves if needs_fetch_move(m)])
-    items_to_fetch = sorted([i for i in items if needs_fetch_item(i)])
+    now = time.time()
+    fetch_opts = (args.refetch_not_found, args.revalidate, args.not_found_ttl_days * 86400, now)
+    moves_to_fetch = sorted(m for m in moves if needs_fetch(moves_cache.get(m), "type", *fetch_opts))
+    items_to_fetch = sorted(i for i in items if needs_fetch(items_cache.get(i), "sprite_url", *fetch_opts))
 
     logger.info(f"Moves: {len(moves)} unique, {len(moves_to_fetch)} to fetch.")
     logger.info(f"Items: {len(items)} unique, {len(items_to_fetch)} to fetch.")
 
-    for idx, slug in enumerate(moves_to_fetch, start=1):
-        try:
-            t, nf, meta_info = fetch_move_type(slug)
-            moves_cache[slug] = {"name": slug, "type": t, "not_found": nf, **meta_info}
-            if idx % 50 == 0:
+    session = make_session(args.concurrency, USER_AGENT)
+
+    # Un único token bucket para ambas pasadas y todos los hilos: --sleep sigue
+    # siendo el hueco mínimo entre peticiones, como en la versión secuencial.
+    # La concurrencia solo solapa la latencia, no sube el ritmo contra PokéAPI
+    limiter = RateLimiter(rate=1.0 / args.sleep, burst=1) if args.sleep > 0 else None
+
+    rate_limit_ms = int(args.sleep * 1000) if args.sleep else 0
+
+    def checkpoint() -> None:
+        # save_json es atómico: si se corta la descarga, el cache en disco
+        # queda con todo lo obtenido hasta el último volcado
+        update_meta(cache, rate_limit_ms=rate_limit_ms)
+        save_json(cache_path, cache)
+
+    not_modified = 0
+    with session:
+        moves_results = fetch_all(moves_to_fetch, fetch_move_type, session, limiter, args.concurrency, moves_cache)
+        for idx, (slug, res, err) in enumerate(moves_results, start=1):
+            if err is not None:
+                logger.error(f"Failed to fetch move {slug}: {err}")
+                continue
+            if res is None:
+                # 304: la entrada del cache sigue siendo válida
+                not_modified += 1
+            else:
+                t, nf, meta_info = res
+                moves_cache[slug] = {"name": slug, "type": t, "not_found": nf, **meta_info}
+                if nf:
+                    moves_cache[slug]["checked_at_unix"] = int(time.time())
+            if idx % CHECKPOINT_EVERY == 0:
                 logger.info(f"  moves progress: {idx}/{len(moves_to_fetch)}")
-        except Exception as e:
-            logger.error(f"Failed to fetch move {slug}: {e}")
-        
-        if args.sleep:
-            time.sleep(args.sleep)
+                checkpoint()
 
-    for idx, slug in enumerate(items_to_fetch, start=1):
-        try:
-            sprite, nf, meta_info = fetch_item_sprite(slug)
-            items_cache[slug] = {"name": slug, "sprite_url": sprite, "not_found": nf, **meta_info}
-            if idx % 50 == 0:
+        items_results = fetch_all(items_to_fetch, fetch_item_sprite, session, limiter, args.concurrency, items_cache)
+        for idx, (slug, res, err) in enumerate(items_results, start=1):
+            if err is not None:
+                logger.error(f"Failed to fetch item {slug}: {err}")
+                continue
+            if res is None:
+                not_modified += 1
+            else:
+                sprite, nf, meta_info = res
+                items_cache[slug] = {"name": slug, "sprite_url": sprite, "not_found": nf, **meta_info}
+                if nf:
+                    items_cache[slug]["checked_at_unix"] = int(time.time())
+            if idx % CHECKPOINT_EVERY == 0:
                 logger.info(f"  items progress: {idx}/{len(items_to_fetch)}")
-        except Exception as e:
-            logger.error(f"Failed to fetch item {slug}: {e}")
+                checkpoint()
 
-        if args.sleep:
-            time.sleep(args.sleep)
+    if not_modified:
+        logger.info(f"Not modified (304): {not_modified} entries kept from cache.")
 
-    update_meta(cache, rate_limit_ms=int(args.sleep * 1000) if args.sleep else 0)
-    save_json(cache_path, cache)
+    checkpoint()
     logger.info(f"Cache saved to: {cache_path}")
     
     return 0
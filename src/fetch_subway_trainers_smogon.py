@@ -4,16 +4,23 @@
 from __future__ import annotations
 
 import argparse
-import json
 import re
 import logging
-from dataclasses import asdict, dataclass
+import unicodedata
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 
+try:
+    from .html_parser import HTML_PARSER
+    from .jsonio import json_dumps
+except ImportError:  # ejecutado como script: src/ es sys.path[0]
+    from html_parser import HTML_PARSER
+    from jsonio import json_dumps
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,6 +30,14 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_URL = "https://www.smogon.com/ingame/bc/bw_subway_trainers"
 
+# Regex precompiladas: slugify y normalize_section_token se llaman por token
+_SLUG_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_SECTION_RE = re.compile(r"set\s*([1-5])")
+
+_NOT_TRAINER_NAMES = frozenset(
+    {"table of contents", "introduction", "normal subway trainers", "super subway trainers"}
+)
+
 
 @dataclass
 class TrainerEntry:
@@ -32,10 +47,15 @@ class TrainerEntry:
     pool_global_ids: List[int]
     source_url: str = DEFAULT_URL
 
+    def to_dict(self) -> Dict[str, Any]:
+        # Copia superficial en orden de campos: asdict() hace un deepcopy
+        # recursivo (incluida la lista del pool) que aquí no hace falta
+        return dict(self.__dict__)
+
 
 def write_json(path: Path, payload: object) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    path.write_bytes(json_dumps(payload) + b"\n")
 
 
 def fetch_html(url: str, timeout: int = 30) -> str:
@@ -46,27 +66,30 @@ def fetch_html(url: str, timeout: int = 30) -> str:
 
 def slugify(s: str) -> str:
     s = s.strip().lower()
-    try:
-        import unicodedata
+    # Texto ASCII (casi todos los nombres) no tiene acentos que quitar
+    if not s.isascii():
         s = unicodedata.normalize("NFKD", s)
         s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    except Exception:
-        pass
-    return re.sub(r"[^a-z0-9]+", "-", s).strip("-")
+    return _SLUG_NON_ALNUM_RE.sub("-", s).strip("-")
 
 
-def extract_tokens(html: str) -> List[str]:
-    soup = BeautifulSoup(html, "html.parser")
+def extract_tokens(html: str) -> Iterator[str]:
+    soup = BeautifulSoup(html, HTML_PARSER)
     text = soup.get_text("\n")
-    raw_lines = [ln.strip() for ln in text.splitlines()]
-    return [ln for ln in raw_lines if ln]
+    for ln in text.splitlines():
+        ln = ln.strip()
+        if ln:
+            yield ln
 
 
 def normalize_section_token(token: str) -> Optional[str]:
     t = token.strip().lower()
-    if re.fullmatch(r"set\s*[1-5]", t):
-        n = re.sub(r"\D", "", t)
-        return f"Super Set {n}"
+    # Casi ningún token empieza por "set": la regex solo corre para esos
+    if t.startswith("set"):
+        m = _SECTION_RE.fullmatch(t)
+        if m:
+            return f"Super Set {m.group(1)}"
+        return None
     if t == "special":
         return "Super Special"
     return None
@@ -81,90 +104,99 @@ def is_comma_token(tok: str) -> bool:
 
 
 def looks_like_trainer_name(tok: str) -> bool:
-    low = tok.lower()
-    forbidden = {"table of contents", "introduction", "normal subway trainers", "super subway trainers"}
-    if low in forbidden:
-        return False
-    if normalize_section_token(tok) is not None:
-        return False
+    # Comprobaciones baratas primero; la de sección (regex) va al final
     if is_int_token(tok) or is_comma_token(tok):
         return False
     if len(tok) > 80:
         return False
+    if tok.lower() in _NOT_TRAINER_NAMES:
+        return False
+    if normalize_section_token(tok) is not None:
+        return False
     return any(ch.isalpha() for ch in tok)
 
 
-def consume_pool(tokens: List[str], start: int) -> Tuple[List[int], int]:
-    nums: List[int] = []
-    i = start
-
-    if i < len(tokens) and is_int_token(tokens[i]):
-        nums.append(int(tokens[i]))
-        i += 1
-    else:
-        return [], start
-
-    while i + 1 < len(tokens) and is_comma_token(tokens[i]) and is_int_token(tokens[i + 1]):
-        nums.append(int(tokens[i + 1]))
-        i += 2
-
-    return nums, i
-
-
-def parse_trainers(tokens: List[str], wanted_sections: Set[str]) -> List[TrainerEntry]:
+def consume_pool(first: str, it: Iterator[str]) -> Tuple[List[int], Optional[str]]:
+    """
+    Lee un pool "1 , 2 , 3" empezando por el entero ``first`` y tirando del
+    iterador. Devuelve (ids, sobrante): el sobrante es el primer token que ya
+    no forma parte del pool (None si se acabaron los tokens). Una coma sin
+    entero detrás se descarta sin más: el bucle principal la ignoraría igual.
+    """
+    nums = [int(first)]
+    while True:
+        tok = next(it, None)
+        if tok is None or not is_comma_token(tok):
+            return nums, tok
+        tok = next(it, None)
+        if tok is None or not is_int_token(tok):
+            return nums, tok
+        nums.append(int(tok))
+
+
+def parse_trainers(tokens: Iterable[str], wanted_sections: Set[str]) -> List[TrainerEntry]:
+    """
+    Recorre los tokens una sola vez: busca "Super Subway Trainers", después la
+    primera sección y a partir de ahí pares nombre -> pool. Si un paso lee un
+    token de más, lo deja en ``pending`` para que lo procese la vuelta
+    siguiente.
+    """
     entries: List[TrainerEntry] = []
+    it = iter(tokens)
 
-    try:
-        super_idx = next(i for i, t in enumerate(tokens) if t.strip().lower() == "super subway trainers")
-    except StopIteration:
+    for tok in it:
+        if tok.strip().lower() == "super subway trainers":
+            break
+    else:
         logger.error("No se encontró la sección 'Super Subway Trainers' en el HTML.")
         return []
 
-    i = super_idx + 1
     current_section: Optional[str] = None
-
-    while i < len(tokens):
-        sec = normalize_section_token(tokens[i])
-        if sec:
-            current_section = sec
-            i += 1
+    for tok in it:
+        current_section = normalize_section_token(tok)
+        if current_section:
             break
-        i += 1
 
     if current_section is None:
         return []
 
-    while i < len(tokens):
-        tok = tokens[i]
+    # Solo cambia al cruzar una cabecera de sección: no hace falta mirar el
+    # set de secciones pedidas en cada token
+    in_wanted = current_section in wanted_sections
+    pending: Optional[str] = None
+    while True:
+        if pending is not None:
+            tok, pending = pending, None
+        else:
+            tok = next(it, None)
+            if tok is None:
+                break
+
         sec = normalize_section_token(tok)
-        
         if sec:
             current_section = sec
-            i += 1
+            in_wanted = sec in wanted_sections
             continue
 
-        if current_section not in wanted_sections:
-            i += 1
+        if not in_wanted:
             continue
 
         if looks_like_trainer_name(tok):
             name = tok
-            if i + 1 < len(tokens) and is_int_token(tokens[i + 1]):
-                nums, j = consume_pool(tokens, i + 1)
-                if nums:
-                    tid = slugify(f"{current_section}-{name}")
-                    entries.append(
-                        TrainerEntry(
-                            trainer_id=tid,
-                            name_en=name,
-                            section=current_section,
-                            pool_global_ids=nums,
-                        )
+            nxt = next(it, None)
+            if nxt is not None and is_int_token(nxt):
+                nums, pending = consume_pool(nxt, it)
+                tid = slugify(f"{current_section}-{name}")
+                entries.append(
+                    TrainerEntry(
+                        trainer_id=tid,
+                        name_en=name,
+                        section=current_section,
+                        pool_global_ids=nums,
                     )
-                    i = j
-                    continue
-
-        i += 1
+                )
+            else:
+                pending = nxt
 
     uniq: Dict[str, TrainerEntry] = {e.trainer_id: e for e in entries}
     return list(uniq.values())
@@ -198,9 +230,11 @@ def main() -> int:
         logger.error(f"Error al descargar: {e}")
         return 1
         
-    tokens = extract_tokens(html)
+    tokens: Iterable[str] = extract_tokens(html)
 
     if args.debug_dump:
+        # El volcado necesita indexar: solo aquí se materializa la lista
+        tokens = list(tokens)
         try:
             idx = next(i for i, t in enumerate(tokens) if "Joshua" in t)
             lo, hi = max(0, idx - 5), min(len(tokens), idx + 20)
@@ -216,7 +250,7 @@ def main() -> int:
 
     payload = {
         "meta": {"source": args.url, "trainer_count": len(trainers), "sections": sorted(wanted)},
-        "trainers": [asdict(t) for t in trainers],
+        "trainers": [t.to_dict() for t in trainers],
     }
 
     out_path = Path(args.out)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parser de BeautifulSoup compartido por los scripts que descargan páginas de Smogon.
+"""
+
+try:
+    import lxml  # noqa: F401  (solo para saber si BeautifulSoup puede usarlo)
+
+    HTML_PARSER = "lxml"
+except ImportError:  # opcional: el parser de la stdlib es puro Python y bastante más lento
+    HTML_PARSER = "html.parser"
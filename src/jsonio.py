@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+E/S JSON compartida por los scripts de src/. Usa orjson si está instalado y,
+si no, json de la stdlib con la misma salida (UTF-8, indentación de 2).
+
+No se llama json ni _json: con src/ en sys.path[0] (los scripts se ejecutan
+desde ahí) taparía el json de la stdlib o su acelerador en C, _json.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson usamos json de la stdlib
+    orjson = None
+
+# A partir de este tamaño se lee con mmap; los sets pesan ~1 KB y ahí el mmap
+# cuesta más de lo que ahorra
+MMAP_MIN_BYTES = 64 * 1024
+
+PathLike = Union[str, Path]
+
+
+def json_loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def json_dumps(payload: Any, compact: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(payload, option=option)
+    if compact:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def read_json(path: PathLike) -> Any:
+    """
+    Lee y parsea un JSON. Los ficheros grandes (base_stats.json, el cache de
+    moves/items) se mapean en memoria y orjson parsea directamente sobre las
+    páginas mapeadas, sin copiarlas antes a un bytes.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return json_loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if orjson is not None:
+                with memoryview(mm) as buf:
+                    return orjson.loads(buf)
+            return json.loads(mm[:])
+
+
+def write_json(path: PathLike, payload: Any, compact: bool = False) -> None:
+    """Escribe el JSON con salto de línea final. No crea el directorio."""
+    with open(path, "wb") as f:
+        f.write(json_dumps(payload, compact) + b"\n")
@@ -1,18 +1,27 @@
 from __future__ import annotations
 
-import itertools
+import asyncio
+import bisect
 import json
 import logging
+import math
 import os
 import re
+import unicodedata
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel
 
+try:
+    from .jsonio import json_loads, orjson
+except ImportError:  # run from inside src/
+    from jsonio import json_loads, orjson
+
 
 # ----------------------------
 # Logging
@@ -55,6 +64,11 @@ settings = Settings()
 # ----------------------------
 # Utils
 # ----------------------------
+_NON_WORD_RE = re.compile(r"[^\w\s]+", flags=re.UNICODE)
+_WS_RE = re.compile(r"\s+", flags=re.UNICODE)
+
+
+@lru_cache(maxsize=4096)
 def normalize(s: str) -> str:
     """
     Unicode-friendly normalization:
@@ -63,28 +77,30 @@ def normalize(s: str) -> str:
       - keep unicode word chars (Japanese/Korean included) and spaces
       - collapse whitespace
     """
-    import unicodedata
-
     s = (s or "").strip()
     if not s:
         return ""
 
     # casefold works well for latin; harmless for most scripts
-    s = s.casefold()
+    s_norm = s.casefold()
 
-    # Remove diacritics but keep base characters
-    s_norm = unicodedata.normalize("NFKD", s)
-    s_norm = "".join(ch for ch in s_norm if not unicodedata.combining(ch))
+    # Remove diacritics but keep base characters. ASCII is already NFKD and
+    # has no combining marks, so most English queries skip this pass.
+    if not s_norm.isascii():
+        s_norm = unicodedata.normalize("NFKD", s_norm)
+        s_norm = "".join(ch for ch in s_norm if not unicodedata.combining(ch))
 
     # Remove punctuation/symbols, keep unicode letters/digits/underscore and spaces
-    s_norm = re.sub(r"[^\w\s]+", " ", s_norm, flags=re.UNICODE)
-    s_norm = re.sub(r"\s+", " ", s_norm, flags=re.UNICODE).strip()
+    s_norm = _NON_WORD_RE.sub(" ", s_norm)
+    s_norm = _WS_RE.sub(" ", s_norm).strip()
     return s_norm
 
 
 def read_json(path: Path) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so both parsers
+    # surface the same RuntimeError below
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json_loads(path.read_bytes())
     except FileNotFoundError:
         raise RuntimeError(f"Missing file: {path}")
     except json.JSONDecodeError as e:
@@ -117,6 +133,15 @@ def load_trainers() -> List[dict]:
     return trainers
 
 
+@lru_cache(maxsize=1)
+def load_trainers_by_id() -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    for t in load_trainers():
+        # setdefault keeps the first trainer for a repeated id, as the old scan did
+        out.setdefault(t.get("trainer_id"), t)
+    return out
+
+
 @lru_cache(maxsize=1)
 def load_pools() -> Dict[str, dict]:
     require_file(settings.POOLS_FILE, "Run: python src/dedupe_trainer_pools.py")
@@ -149,16 +174,55 @@ def load_sets_index_global() -> Dict[str, str]:
     return {str(k): str(v) for k, v in idx.items()}
 
 
-@lru_cache(maxsize=4096)
-def load_set_by_global_id(global_id: int) -> dict:
-    gid = str(global_id)
-    idx = load_sets_index_global()
-    fn = idx.get(gid)
+# global_id -> parsed set, filled by load_sets_by_global_ids. A plain dict
+# rather than lru_cache because that loader is async (~1000 sets in total).
+_SETS_CACHE: Dict[int, dict] = {}
+
+
+def set_path_by_global_id(global_id: int) -> Path:
+    fn = load_sets_index_global().get(str(global_id))
     if not fn:
         raise KeyError(f"global_id {global_id} not found in sets index")
+    return settings.SETS_DIR / fn
+
+
+async def load_cached(loader: Callable[[], Any]) -> Any:
+    """
+    Calls one of the lru_cache(maxsize=1) loaders from an async endpoint. The
+    first call reads and parses a data file, so it runs in a worker thread
+    instead of blocking the event loop; later calls are plain cache hits.
+    """
+    if loader.cache_info().currsize:
+        return loader()
+    return await asyncio.to_thread(loader)
 
-    path = settings.SETS_DIR / fn
-    return read_json(path)
+
+async def load_sets_by_global_ids(global_ids: List[int], skip_missing: bool = False) -> List[dict]:
+    """
+    Returns the parsed sets for global_ids, in order, memoized in _SETS_CACHE.
+    Files not cached yet are read concurrently in worker threads so a cold
+    pool doesn't block the loop. Ids missing from the sets index raise
+    KeyError unless skip_missing.
+    """
+    await load_cached(load_sets_index_global)
+    to_read: Dict[int, Path] = {}
+    for gid in global_ids:
+        if gid in _SETS_CACHE or gid in to_read:
+            continue
+        try:
+            to_read[gid] = set_path_by_global_id(gid)
+        except KeyError:
+            if not skip_missing:
+                raise
+
+    if to_read:
+        loaded = await asyncio.gather(*(asyncio.to_thread(read_json, p) for p in to_read.values()))
+        # No await between here and the return, so concurrent requests can't
+        # interleave; at worst two cold requests read the same file twice.
+        for gid, data in zip(to_read, loaded):
+            _SETS_CACHE.setdefault(gid, data)
+
+    return [_SETS_CACHE[gid] for gid in global_ids if gid in _SETS_CACHE]
 
 
 @lru_cache(maxsize=1)
@@ -211,33 +275,46 @@ def build_trainer_search_rows() -> List[dict]:
                 "display_name": display_name_from_trainer(t),
                 "section": t["section"],
                 "aliases": aliases,
+                # normalize() collapses whitespace, so no alias or query
+                # contains "\n" and a substring test on the joined text can't
+                # match across two aliases
+                "alias_text": "\n".join(aliases),
             }
         )
     return rows
 
 
-def combos_remaining(pool_ids: List[int], seen: Set[int], team_size: int = 4) -> Tuple[int, Set[int]]:
-    pool_sorted = sorted(pool_ids)
+@lru_cache(maxsize=1)
+def build_search_index() -> Tuple[List[str], Dict[str, List[int]], List[dict]]:
+    """
+    Sorted aliases plus alias -> row indexes, so prefix lookups are a bisect
+    instead of a scan over every row.
+    """
+    rows = build_trainer_search_rows()
+    alias_to_rowidx: Dict[str, List[int]] = {}
+    for idx, r in enumerate(rows):
+        for a in r["aliases"]:
+            alias_to_rowidx.setdefault(a, []).append(idx)
+    return sorted(alias_to_rowidx), alias_to_rowidx, rows
+
 
+def combos_remaining(pool_ids: List[int], seen: Set[int], team_size: int = 4) -> Tuple[int, Set[int]]:
     if len(seen) > team_size:
         return 0, set()
 
-    pool_set = set(pool_sorted)
+    pool_set = set(pool_ids)
     if not seen.issubset(pool_set):
         return 0, set()
 
-    if len(pool_sorted) < team_size:
+    # Every compatible team holds all of `seen` plus any `free` of the other
+    # ids, so the count is C(n - k, free) and any id can appear in some team.
+    free = team_size - len(seen)
+    rest = len(pool_set) - len(seen)
+    if rest < free:
         return 0, set()
 
-    count = 0
-    union: Set[int] = set()
-
-    for comb in itertools.combinations(pool_sorted, team_size):
-        if seen and not seen.issubset(comb):
-            continue
-        count += 1
-        union.update(comb)
-
+    count = math.comb(rest, free)
+    union = set(pool_set) if free > 0 else set(seen)
     return count, union
 
 
@@ -282,7 +359,14 @@ class FilterResponse(BaseModel):
 # ----------------------------
 # App
 # ----------------------------
-app = FastAPI(title="Battle Subway Helper (B2/W2) - Super Set 4/5", version="1.0.0")
+# ORJSONResponse needs orjson at render time; keep the stdlib encoder otherwise.
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+app = FastAPI(
+    title="Battle Subway Helper (B2/W2) - Super Set 4/5",
+    version="1.0.0",
+    default_response_class=DefaultResponse,
+)
 
 if settings.CORS_ORIGINS:
     logger.info("CORS enabled for: %s", settings.CORS_ORIGINS)
@@ -303,23 +387,26 @@ def health():
 @app.get("/trainers/search", response_model=List[SearchResult])
 def trainers_search(q: str = Query(..., min_length=1), limit: int = 20):
     nq = normalize(q)
-    rows = build_trainer_search_rows()
+    sorted_aliases, alias_to_rowidx, rows = build_search_index()
     lim = max(1, min(limit, 50))
 
-    # 1) Prefix matches
-    prefix: List[dict] = [r for r in rows if any(a.startswith(nq) for a in r["aliases"])]
-    prefix_ids = {r["trainer_id"] for r in prefix}
+    # 1) Prefix matches (kept in row order)
+    prefix_idx: Set[int] = set()
+    pos = bisect.bisect_left(sorted_aliases, nq)
+    while pos < len(sorted_aliases) and sorted_aliases[pos].startswith(nq):
+        prefix_idx.update(alias_to_rowidx[sorted_aliases[pos]])
+        pos += 1
+    matches: List[dict] = [rows[i] for i in sorted(prefix_idx)[:lim]]
 
     # 2) Contains matches (without duplicates)
-    contains: List[dict] = []
-    if len(prefix) < lim:
-        for r in rows:
-            if r["trainer_id"] in prefix_ids:
+    if len(matches) < lim:
+        for idx, r in enumerate(rows):
+            if idx in prefix_idx:
                 continue
-            if any(nq in a for a in r["aliases"]):
-                contains.append(r)
-
-    matches = (prefix + contains)[:lim]
+            if nq in r["alias_text"]:
+                matches.append(r)
+                if len(matches) >= lim:
+                    break
     return [
         SearchResult(
             trainer_id=m["trainer_id"],
@@ -333,28 +420,23 @@ def trainers_search(q: str = Query(..., min_length=1), limit: int = 20):
 
 
 @app.get("/trainers/{trainer_id}", response_model=TrainerDetail)
-def trainer_detail(trainer_id: str):
-    trainers = load_trainers()
-    t = next((x for x in trainers if x.get("trainer_id") == trainer_id), None)
+async def trainer_detail(trainer_id: str):
+    t = (await load_cached(load_trainers_by_id)).get(trainer_id)
     if not t:
         raise HTTPException(status_code=404, detail="trainer_id not found")
 
-    pools_index = load_pools_index()
+    pools_index = await load_cached(load_pools_index)
     trainer_to_pool = pools_index.get("trainer_to_pool", {})
     pool_id = trainer_to_pool.get(trainer_id)
     if not pool_id:
         raise HTTPException(status_code=500, detail="trainer_to_pool index missing this trainer")
 
-    pool = load_pools().get(pool_id)
+    pool = (await load_cached(load_pools)).get(pool_id)
     if not pool:
         raise HTTPException(status_code=500, detail="pool_id not found in pools file")
 
-    sets: List[dict] = []
-    for gid in pool.get("pool_global_ids", []):
-        try:
-            sets.append(load_set_by_global_id(int(gid)))
-        except KeyError:
-            continue
+    gids = [int(gid) for gid in pool.get("pool_global_ids", [])]
+    sets = await load_sets_by_global_ids(gids, skip_missing=True)
 
     name_es = t.get("name_es") if isinstance(t.get("name_es"), str) else None
     names = t.get("names") if isinstance(t.get("names"), dict) else None
@@ -375,8 +457,8 @@ def trainer_detail(trainer_id: str):
 
 
 @app.post("/pools/{pool_id}/filter", response_model=FilterResponse)
-def pool_filter(pool_id: str, req: FilterRequest):
-    pool = load_pools().get(pool_id)
+async def pool_filter(pool_id: str, req: FilterRequest):
+    pool = (await load_cached(load_pools)).get(pool_id)
     if not pool:
         raise HTTPException(status_code=404, detail="pool_id not found")
 
@@ -385,14 +467,18 @@ def pool_filter(pool_id: str, req: FilterRequest):
 
     num, union = combos_remaining(pool_ids, seen, team_size=4)
     remaining = [] if num == 0 else sorted(list(union - seen))
-    remaining_sets = [load_set_by_global_id(gid) for gid in remaining]
-
-    return FilterResponse(
-        pool_id=pool_id,
-        seen_global_ids=sorted(list(seen)),
-        num_possible_teams=num,
-        possible_remaining_global_ids=remaining,
-        possible_remaining_sets=remaining_sets,
+    remaining_sets = await load_sets_by_global_ids(remaining)
+
+    # The set blobs are already plain JSON dicts: return them directly instead
+    # of re-validating them through FilterResponse (still used for the docs).
+    return DefaultResponse(
+        content={
+            "pool_id": pool_id,
+            "seen_global_ids": sorted(list(seen)),
+            "num_possible_teams": num,
+            "possible_remaining_global_ids": remaining,
+            "possible_remaining_sets": remaining_sets,
+        }
     )
 
 
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Piezas HTTP compartidas por los scripts que consultan PokéAPI: sesión con
+reintentos, concurrencia por defecto, validadores para peticiones
+condicionales y limitador de peticiones.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Peticiones simultáneas a PokéAPI por defecto (la latencia domina, no la CPU)
+DEFAULT_CONCURRENCY = 4
+
+
+def make_session(pool_size: int, user_agent: str) -> requests.Session:
+    """
+    Sesión compartida: reutiliza conexiones keep-alive (un solo handshake TLS
+    por conexión) y reintenta errores transitorios con backoff.
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": user_agent, "Connection": "keep-alive"})
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1), max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def conditional_headers(entry: Any) -> Optional[Dict[str, str]]:
+    """
+    If-None-Match / If-Modified-Since a partir de los validadores guardados en
+    una entrada previa. None si la entrada no tiene ninguno.
+    """
+    if not isinstance(entry, dict):
+        return None
+    headers: Dict[str, str] = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers or None
+
+
+def response_validators(r: requests.Response) -> Dict[str, str]:
+    """ETag / Last-Modified de una respuesta, con las claves que se guardan en disco."""
+    validators: Dict[str, str] = {}
+    etag = r.headers.get("ETag")
+    if etag:
+        validators["etag"] = etag
+    last_modified = r.headers.get("Last-Modified")
+    if last_modified:
+        validators["last_modified"] = last_modified
+    return validators
+
+
+class RateLimiter:
+    """
+    Token bucket compartido por todos los hilos: como mucho ``rate`` peticiones
+    por segundo de media, con ráfagas de hasta ``burst``. Cada acquire()
+    reserva su hueco bajo el lock y espera fuera de él, así que un hilo solo
+    duerme si va por delante del ritmo permitido.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
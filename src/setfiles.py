@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Listado de los ficheros de sets y reparto del trabajo por fichero entre
+workers, compartido por los scripts que recorren data/subway_pokemon.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+# Por debajo de este número de ficheros no compensa arrancar procesos
+PROCESS_POOL_MIN_FILES = 256
+
+
+def iter_set_files(sets_dir: Path) -> Iterator[Path]:
+    """Ficheros .json del directorio (sin los reservados "_*"), en orden de listado."""
+    # scandir trae el tipo de entrada del propio listado: sin un stat() por fichero
+    with os.scandir(sets_dir) as it:
+        for e in it:
+            n = e.name
+            if n.endswith(".json") and not n.startswith("_") and e.is_file():
+                yield Path(e.path)
+
+
+def list_set_files(sets_dir: Path) -> List[Path]:
+    """Como iter_set_files, pero ordenados por nombre."""
+    return sorted(iter_set_files(sets_dir), key=lambda p: p.name)
+
+
+def map_files(
+    fn: Callable[[Any], Any],
+    paths: Sequence[Any],
+    workers: Optional[int] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+    chunksize: int = 16,
+) -> List[Any]:
+    """
+    Aplica fn a cada fichero y devuelve los resultados en el orden de paths.
+    workers=1 va en secuencial en este proceso; si no, usa procesos a partir de
+    PROCESS_POOL_MIN_FILES ficheros e hilos por debajo. initializer(*initargs)
+    prepara el estado de cada worker (o del propio proceso en secuencial), así
+    que fn debe ser una función de módulo que lea ese estado.
+    """
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [fn(p) for p in paths]
+
+    executor_cls = ProcessPoolExecutor if len(paths) >= PROCESS_POOL_MIN_FILES else ThreadPoolExecutor
+    with executor_cls(max_workers=workers, initializer=initializer, initargs=initargs) as ex:
+        return list(ex.map(fn, paths, chunksize=chunksize))
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+Normalización de nombres de movimientos/objetos a slugs de PokéAPI, compartida
+por el fetcher del cache y el enriquecedor que lo lee.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+_CAMEL_SPLIT = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_NON_ALNUM = re.compile(r"[^a-zA-Z0-9]+")
+
+
+@lru_cache(maxsize=4096)
+def canonical_slug(name: str) -> str:
+    """
+    Convert Smogon-ish names into a PokeAPI-friendly kebab-case slug.
+      - "BrightPowder" -> "bright-powder"
+      - "Black Belt"   -> "black-belt"
+      - "BubbleBeam"   -> "bubble-beam"
+      - "Will-O-Wisp"  -> "will-o-wisp"
+      - "Hi Jump Kick" -> "hi-jump-kick" (then alias-mapped to "high-jump-kick")
+    """
+    if not name:
+        return ""
+    s = name.strip().replace("_", " ").strip()
+
+    # Split CamelCase if no spaces and no hyphens (all-lowercase input has
+    # nothing to split, so the regex is skipped for names that are already slugs)
+    if " " not in s and "-" not in s and not s.islower():
+        s = _CAMEL_SPLIT.sub("-", s)
+
+    # _NON_ALNUM already collapses each run of separators into a single "-"
+    return _NON_ALNUM.sub("-", s).strip("-").lower()